@@ -0,0 +1,209 @@
+"""
+Benchmarks of parsing networks and answering single queries with ve, on the
+bundled networks and on generated chains, ladders, grids, polytrees and random
+DAGs. Every case runs in a separate process, so the peak memory belongs to the
+case alone. The median latency, the peak memory and the factor operations are
+compared with benchmarks/baseline.json.
+
+    python benchmarks/run.py                 compare all cases with the baseline
+    python benchmarks/run.py grid            only the cases with grid in the name
+    python benchmarks/run.py --update        store the results as the new baseline
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+try:
+    import resource
+except ImportError:
+    resource = None  # the peak memory is only measured on unix
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(root, 'src'))
+
+baseline_path = os.path.join(root, 'benchmarks', 'baseline.json')
+
+
+# a case parses a network, or answers a query on it when a query is given. A
+# synthetic network is given by the arguments of generate.structure
+cases = {
+    'parse-alarm': {'network': 'data/alarm.bif'},
+    'parse-survey': {'network': 'data/survey.bif'},
+    'parse-earthquake': {'network': 'data/earthquake.bif'},
+    'parse-chain-300': {'network': ('chain', 300)},
+    'parse-grid-12x12': {'network': ('grid', 144, 2, 12)},
+    'parse-dag-500': {'network': ('random-dag', 500, 3, 6)},
+    'parse-polytree-500': {'network': ('polytree', 500, 3)},
+
+    # only the parser of the .bif file, at a scale where it dominates
+    'tokenize-dag-10000': {'network': ('random-dag', 10000, 3, 8), 'parser': 'internal', 'repeat': 3},
+    'parse-dag-10000': {'network': ('random-dag', 10000, 3, 8), 'repeat': 3},
+
+    've-alarm': {'network': 'data/alarm.bif',
+        'query': ['Leaving', 'Smoke'], 'evidence': {'Alarm': 'False'}},
+    've-survey': {'network': 'data/survey.bif',
+        'query': ['T'], 'evidence': {'A': 'adult', 'R': 'small'}},
+    've-earthquake': {'network': 'data/earthquake.bif',
+        'query': ['Burglary'], 'evidence': {'JohnCalls': 'True', 'MaryCalls': 'True'}},
+    've-chain-300': {'network': ('chain', 300),
+        'query': ['X299'], 'evidence': {'X0': 's1'}},
+    've-ladder-2x100': {'network': ('ladder', 200),
+        'query': ['X1_99'], 'evidence': {'X0_0': 's1'}},
+    've-grid-8x8': {'network': ('grid', 64, 2, 8),
+        'query': ['X7_7'], 'evidence': {'X0_0': 's1'}},
+    've-polytree-300': {'network': ('polytree', 300, 3),
+        'query': ['X299'], 'evidence': {'X0': 's1', 'X150': 's0'}},
+    've-dag-200': {'network': ('random-dag', 200, 3, 6),
+        'query': ['X199'], 'evidence': {'X0': 's1', 'X100': 's0'}},
+}
+
+
+def network_file(case, directory):
+    """The .bif file of the case, generated in the directory for a synthetic network."""
+    import generate
+
+    network = case['network']
+    if type(network) is str:
+        return os.path.join(root, network)
+
+    filename = os.path.join(directory, f'{network[0]}.bif')
+    generate.write_bif(filename, generate.structure(*network))
+    return filename
+
+
+def peak_memory():
+    """The peak resident memory of this process in MiB."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2**20 if sys.platform == 'darwin' else peak / 2**10
+
+
+def measure(name, repeat):
+    """Run the case in this process and return the measurements."""
+    import algorithm
+    import generate
+    import util
+    from network import Network, InternalNetwork
+    from tracing import Trace
+
+    util.verbosity = 0
+    case = cases[name]
+    repeat = min(repeat, case.get('repeat', repeat))
+    times = []
+
+    if 'query' not in case:
+        parse = InternalNetwork if case.get('parser') == 'internal' else \
+            lambda filename: Network(filename, cache = False)
+        with tempfile.TemporaryDirectory() as directory:
+            filename = network_file(case, directory)
+            for _ in range(repeat):
+                start = time.perf_counter()
+                parse(filename)
+                times.append(time.perf_counter() - start)
+        return {'median': statistics.median(times), 'memory': peak_memory()}
+
+    if type(case['network']) is str:
+        network = Network(os.path.join(root, case['network']), cache = False)
+    else:
+        network = generate.network(generate.structure(*case['network']))
+
+    # every query starts without any cached factors
+    for _ in range(repeat):
+        algorithm.cache.clear()
+        start = time.perf_counter()
+        algorithm.ve(network, case['query'], case['evidence'], 'min-fill')
+        times.append(time.perf_counter() - start)
+
+    # count the operations in a separate run, the trace takes time as well
+    algorithm.cache.clear()
+    flops = algorithm.flops['actual']
+    with Trace() as trace:
+        algorithm.ve(network, case['query'], case['evidence'], 'min-fill')
+
+    return {
+        'median': statistics.median(times),
+        'memory': peak_memory(),
+        'flops': algorithm.flops['actual'] - flops,
+        'products': len(trace.steps),
+        'largest': trace.largest()['product_size'],
+    }
+
+
+def run(name, repeat):
+    """Run the case in a new process and return the measurements."""
+    output = subprocess.run([sys.executable, os.path.abspath(__file__), '--case', name,
+        '--repeat', str(repeat)], capture_output = True, text = True, check = True, cwd = root).stdout
+    return json.loads(output)
+
+
+def compare(name, result, baseline, tolerance):
+    """The regressions of the result compared to the baseline, as text."""
+    if name not in baseline:
+        return []
+    regressions = []
+    if result['median'] > baseline[name]['median'] * (1 + tolerance):
+        regressions.append(f'latency {baseline[name]["median"] * 1e3:.3f} ms -> {result["median"] * 1e3:.3f} ms')
+    if result.get('flops', 0) > baseline[name].get('flops', 0):
+        regressions.append(f'flops {baseline[name]["flops"]} -> {result["flops"]}')
+    if result['memory'] and baseline[name]['memory'] and \
+            result['memory'] > baseline[name]['memory'] * (1 + tolerance):
+        regressions.append(f'memory {baseline[name]["memory"]:.1f} MiB -> {result["memory"]:.1f} MiB')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Benchmark parsing and variable elimination.')
+    parser.add_argument('filter', nargs = '?', default = '', help = 'only run the cases containing this text')
+    parser.add_argument('--repeat', type = int, default = 9, help = 'the number of timed runs per case')
+    parser.add_argument('--tolerance', type = float, default = 0.25,
+        help = 'the allowed relative increase of the latency and memory')
+    parser.add_argument('--update', action = 'store_true', help = 'store the results as the baseline')
+    parser.add_argument('--case', help = argparse.SUPPRESS)
+    arguments = parser.parse_args()
+
+    # the measurements of a single case, in the process started by run
+    if arguments.case is not None:
+        print(json.dumps(measure(arguments.case, arguments.repeat)))
+        return 0
+
+    baseline = {}
+    if os.path.exists(baseline_path):
+        with open(baseline_path) as file:
+            baseline = json.load(file)
+
+    results = {}
+    failed = False
+    print(f'{"case":<20} {"median ms":>10} {"base ms":>10} {"MiB":>7} {"flops":>10} {"products":>9}')
+    for name in cases:
+        if arguments.filter not in name:
+            continue
+        result = results[name] = run(name, arguments.repeat)
+        base = f'{baseline[name]["median"] * 1e3:10.3f}' if name in baseline else f'{"-":>10}'
+        memory = f'{result["memory"]:7.1f}' if result['memory'] is not None else f'{"-":>7}'
+        print(f'{name:<20} {result["median"] * 1e3:10.3f} {base} {memory} '
+            f'{result.get("flops", "-"):>10} {result.get("products", "-"):>9}')
+
+        regressions = compare(name, result, baseline, arguments.tolerance)
+        for regression in regressions:
+            print(f'    regression: {regression}')
+        failed = failed or len(regressions) > 0
+
+    if arguments.update:
+        baseline = {name: result for name, result in baseline.items() if name in cases}
+        baseline.update(results)
+        with open(baseline_path, 'w') as file:
+            json.dump(baseline, file, indent = 2, sort_keys = True)
+            file.write('\n')
+        return 0
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,130 +1,438 @@
+from factor import Factor
+from variable import Variable
+import ordering
 import util
 
+import collections
+import concurrent.futures
+import heapq
+import itertools
+import math
+import numpy as np
 import random
+import threading
+import time
 
 
-def barren_recurs(variable, nonbarren, barren):
+class FactorCache:
     """
-    Compute the barren nodes recursively. This function returns whether a given
-    variable is a barren node. All the barren nodes are added to the provided
-    list. The nonbarren list consists of the query and evidence variable names.
+    A cache for the intermediate factors of variable elimination with a memory
+    budget in bytes. The keys contain the ids of the input factors, which are
+    never reused. Reductions are cached as well, so the ids of the reduced
+    factors are stable for the same evidence and identify the evidence as well.
+    When the factors take more memory than the budget the least recently used
+    ones are evicted. The cache can be shared by threads.
     """
 
-    # if the variable is either a query or evidence variable it is not barren
-    if variable.name in nonbarren:
-        for child in variable.children:
-            barren_recurs(child, nonbarren, barren)
-        return False
+    def __init__(self, budget):
+        self.budget = budget
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.factors = collections.OrderedDict()
+        self.lock = threading.Lock()
 
-    # if the variable has no children it is barren
-    if len(variable.children) == 0:
-        if not variable in barren: barren.append(variable)
-        return True
 
-    # if all children are barren then we are also barren
-    if all(barren_recurs(child, nonbarren, barren) for child in variable.children):
-        if not variable in barren: barren.append(variable)
-        return True
+    def __len__(self):
+        return len(self.factors)
 
-    # recurs down the tree to check the other nodes
-    for child in variable.children:
-        barren_recurs(child, nonbarren, barren)
-    return False
 
+    def get(self, key):
+        """Get the factor stored under the key, or None if it is not cached."""
+        with self.lock:
+            factor = self.factors.get(key)
+            if factor is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self.factors.move_to_end(key)
+            return factor
 
-def init_barren(variables, query, evidence):
+
+    def __setitem__(self, key, factor):
+        if factor.table.nbytes > self.budget:
+            return
+        with self.lock:
+            if key in self.factors:
+                self.size -= self.factors.pop(key).table.nbytes
+            self.factors[key] = factor
+            self.size += factor.table.nbytes
+
+            while self.size > self.budget:
+                _, evicted = self.factors.popitem(last = False)
+                self.size -= evicted.table.nbytes
+
+
+    def clear(self):
+        with self.lock:
+            self.factors.clear()
+            self.size = 0
+            self.hits = 0
+            self.misses = 0
+
+
+# the cache used by ve, set to None to disable caching
+cache = FactorCache(64 * 2 ** 20)
+
+
+def find_barren(variables, query, evidence, memo = None):
     """
     Compute the barren nodes: neither queried, nor observed and no children or
-    only barren nodes as children.
+    only barren nodes as children. These are exactly the variables which are
+    not an ancestor of a query or evidence variable, so the nonbarren variables
+    are found by walking up from the query and evidence variables, visiting
+    every variable once. When a memo dictionary is given the barren nodes are
+    stored under the query and evidence variables.
     """
+    key = ('barren', frozenset(query), frozenset(evidence))
+    if memo is not None and key in memo:
+        return list(memo[key])
 
     # the query and evidence variables are for sure not barren
-    nonbarren = query + list(evidence.keys())  # list with type variable.name
-    barren = []  # list with type variable
+    names = set(query) | set(evidence)
+    stack = [variable for variable in variables if variable.name in names]
+    nonbarren = set(stack)
+    while stack:
+        for parent in stack.pop().parents:
+            if parent not in nonbarren:
+                nonbarren.add(parent)
+                stack.append(parent)
+
+    barren = sorted(variable for variable in variables if variable not in nonbarren)
+    if memo is not None:
+        memo[key] = barren
+    return list(barren)
 
-    # recurs down from all of the topnodes, i.e. nodes without parents
-    topnodes = [variable for variable in variables if len(variable.parents) == 0]
-    for variable in topnodes:
-        if barren_recurs(variable, nonbarren, barren) and not variable in barren:
-            barren.append(variable)
-    barren.sort()
 
-    util.print_header('Running VE on the following setup')
-    util.print_groups(query, evidence, barren)
+def init_barren(variables, query, evidence, memo = None):
+    """Compute the barren nodes and show the setup of the query."""
+    barren = find_barren(variables, query, evidence, memo)
+
+    if util.sink is not None:
+        util.sink('setup', algorithm = 'VE', query = query, evidence = evidence, barren = barren)
 
     return barren
 
 
-def init_factors(network, evidence, barren):
-    """Construct the nonbarren reduced factors from the network."""
+def find_requisite(variables, query, evidence):
+    """
+    Find the variables whose factors are needed for the distribution of the
+    query variables given the evidence with the Bayes-ball algorithm. A ball is
+    sent from every query variable as if it came from a child. An unobserved
+    variable passes a ball from a child to its parents and its children and a
+    ball from a parent to its children. An observed variable bounces a ball
+    from a parent back to its parents and blocks a ball from a child. The
+    factors of the variables which pass a ball on to their parents are needed,
+    the other factors are d-separated from the query or barren.
+    """
+    top = set()  # the variables which passed a ball to their parents
+    bottom = set()  # the variables which passed a ball to their children
+
+    schedule = [(variable, True) for variable in variables if variable.name in query]
+    while schedule:
+        variable, from_child = schedule.pop()
+        observed = variable.name in evidence
+        if (from_child and not observed) or (not from_child and observed):
+            if variable not in top:
+                top.add(variable)
+                schedule += [(parent, True) for parent in variable.parents]
+        if not observed and variable not in bottom:
+            bottom.add(variable)
+            schedule += [(child, False) for child in variable.children]
+
+    return top
+
+
+def find_irrelevant(variables, query, evidence, memo = None):
+    """
+    Compute the variables whose factors do not change the distribution of the
+    query variables given the evidence. These are the variables which are not
+    requisite according to find_requisite and the variables whose factors are
+    in a connected component without query variables once the evidence is
+    reduced, which only contributes a constant that normalization removes.
+    When a memo dictionary is given the result is stored like in find_barren.
+    """
+    key = ('irrelevant', frozenset(query), frozenset(evidence))
+    if memo is not None and key in memo:
+        return list(memo[key])
+
+    requisite = find_requisite(variables, query, evidence)
+
+    # join the unobserved variables of every reduced factor
+    component = {variable: variable for variable in requisite if variable.name not in evidence}
+
+    def find(variable):
+        while component[variable] != variable:
+            component[variable] = component[component[variable]]
+            variable = component[variable]
+        return variable
+
+    scopes = {}
+    for variable in requisite:
+        scopes[variable] = [other for other in [variable] + variable.parents if other in component]
+        for other in scopes[variable][1:]:
+            component[find(other)] = find(scopes[variable][0])
+
+    queried = {find(variable) for variable in component if variable.name in query}
+    relevant = {variable for variable, scope in scopes.items() if scope and find(scope[0]) in queried}
+    irrelevant = sorted(variable for variable in variables if variable not in relevant)
+    if memo is not None:
+        memo[key] = irrelevant
+    return list(irrelevant)
 
-    # create a list with all the factors for nonbarren variables
-    factors = [network.variable_to_factor(variable)
-        for variable in network.variables if variable not in barren]
+
+def init_irrelevant(variables, query, evidence, barren, memo = None):
+    """Compute the irrelevant variables and show the ones which are not barren."""
+    irrelevant = find_irrelevant(variables, query, evidence, memo)
+
+    if util.sink is not None:
+        barren = set(barren)
+        util.sink('irrelevant', variables = [variable for variable in irrelevant if variable not in barren])
+
+    return irrelevant
+
+
+def init_factors(network, evidence, barren, memo = None):
+    """
+    Construct the nonbarren reduced factors from the network. When a memo
+    dictionary is given the reductions are shared with earlier calls.
+    """
+
+    # the factors for nonbarren variables by the id of their variable
+    barren = set(barren)
+    factors = {variable.id: network.factors[variable.id]
+        for variable in network.variables if variable not in barren}
 
     # util.print_header('Factors of nonbarren nodes')
     # util.print_factors(factors)
 
-    # reduce all of the factors for the evidence given
+    # reduce the factors containing the evidence variable, which are the
+    # factors of the variable itself and of its children
     for evidence_name, value in evidence.items():
-        for i in range(len(factors)):
-            evidence_variable = network.name_to_variable(evidence_name)
-            if evidence_variable in factors[i].variables:
-                factors[i] = factors[i].reduce(evidence_variable, value)
-
-    util.print_header(
-        'Reduced factors of nonbarren nodes based on evidence\n'
-        'Evidence: {}'.format(util.show_evidence(evidence)))
-    util.print_factors_brief(factors)
+        evidence_variable = network.name_to_variable(evidence_name)
+        for index in [evidence_variable.id] + network.child_ids[evidence_variable.id]:
+            if index in factors:
+                key = (factors[index].id, evidence_name, value)
+                reduced = memo.get(key) if memo is not None else None
+                if reduced is None:
+                    reduced = factors[index].reduce(evidence_variable, value)
+                    if memo is not None:
+                        memo[key] = reduced
+                factors[index] = reduced
+
+    factors = list(factors.values())
+    if util.sink is not None:
+        util.sink('reduced', evidence = evidence, factors = factors)
 
     return factors
 
 
-def init_order(network, query, evidence, barren, order):
-    """Construct the order, either abritrary, from the given order, or using the given algorithm."""
+def init_log(factors, memo = None):
+    """
+    Convert the factors to the log domain. When a memo dictionary is given the
+    conversions are shared with earlier calls.
+    """
+    converted = []
+    for factor in factors:
+        key = ('log', factor.id)
+        log_factor = memo.get(key) if memo is not None else None
+        if log_factor is None:
+            log_factor = factor.to_log()
+            if memo is not None:
+                memo[key] = log_factor
+        converted.append(log_factor)
+
+    if util.sink is not None:
+        util.sink('log_domain')
+    return converted
+
 
-    util.print_header('Elimination order')
+def find_order(network, query, evidence, barren, order):
+    """
+    Compute the order, either abritrary, from the given order, or using the
+    given heuristic: 'min-fill', 'min-degree', 'min-weight' or 'weighted-min-fill'.
+    """
 
     # compute all the variables that should be marginalized
+    barren = set(barren)
     marginalize = [variable for variable in network.variables if variable not in barren and
         variable.name not in evidence.keys() and variable.name not in query]
 
     # use an arbitrary order if no instructions are given
     if order is None:
-        util.print_simple('No elimination order instructions are given')
-        util.print_simple('An arbitrary elimination order is chosen')
-        util.print_simple(f'\nOrder: {marginalize}\n')
         return marginalize
 
-    # use the order that is given
+    # use the order that is given, without the variables that are pruned
     if type(order) is list:
         # check if the given order uses the correct variables
-        assert len(set(list(map(lambda variable: variable.name, marginalize)) + order)) == len(order)
+        assert len(set([variable.name for variable in marginalize] + order)) == len(order)
+        names = {variable.name for variable in marginalize}
+        return [network.name_to_variable(name) for name in order if name in names]
+
+    # use the given heuristic on the interaction graph
+    assert order in ordering.heuristics, f'unknown elimination order heuristic {order}'
+
+    graph = ordering.interaction_graph(network.variables, evidence, barren)
+    return ordering.greedy_order(graph, marginalize, order)
+
+
+def init_order(network, query, evidence, barren, order):
+    """Construct the order with find_order and show how it was chosen."""
+
+    method = order
+    order = find_order(network, query, evidence, barren, order)
+    if util.sink is not None:
+        util.sink('order', method = method, order = order)
+    return order
 
-        order = list(map(network.name_to_variable, order))
-        util.print_simple('An elimination order was provided')
-        util.print_simple(f'\nOrder: {order}\n')
-        return order
 
-    # TODO elimination order algorithm is given
+# the strategy to order the products within a bucket, 'greedy' or 'optimal'
+product_order = 'optimal'
 
+# the largest bucket for which the optimal product order is computed exactly
+optimal_limit = 8
 
-def multiply_final(factors):
-    """Multiply all the given factors together."""
+# the number of elementwise multiplications and additions of all the products
+# and marginalizations, as predicted by the plans and as counted by the factor
+# operations which actually ran
+flops = {'predicted': 0, 'actual': 0}
+flops_lock = threading.Lock()
 
-    # sort the factors based on size
-    factors.sort(key = lambda factor: len(factor.variables))
 
-    util.print_simple('Multiplying the following factors:\n')
-    util.print_factors_brief(factors)
+def scope_size(variables):
+    """The number of entries of a table over the given variables."""
+    return math.prod(len(variable.domain) for variable in variables)
 
-    # multiply the factors
-    final_factor = factors[0]
-    for factor in factors[1:]:
-        final_factor = final_factor.product(factor)
 
-    util.print_simple(f'Resulting in:\n')
-    util.print_factor_brief(final_factor)
+def plan_greedy(scopes):
+    """
+    Plan the products of the factors with the given scopes by repeatedly
+    multiplying the pair of factors with the smallest product. A plan is either
+    the index of a factor or a pair of plans which are multiplied. The sizes of
+    the candidate products are kept in a heap, with the pairs containing an
+    already multiplied factor skipped when they come up.
+    """
+    items = {index: (scope, index) for index, scope in enumerate(scopes)}
+    heap = [(scope_size(scopes[i] | scopes[j]), i, j)
+        for i in range(len(scopes)) for j in range(i + 1, len(scopes))]
+    heapq.heapify(heap)
+
+    cost = 0
+    indices = itertools.count(len(scopes))
+    while len(items) > 1:
+        size, i, j = heapq.heappop(heap)
+        if i not in items or j not in items:
+            continue
+        cost += size
+
+        (scope_i, plan_i), (scope_j, plan_j) = items.pop(i), items.pop(j)
+        scope = scope_i | scope_j
+        new = next(indices)
+        for k, (other, _) in items.items():
+            heapq.heappush(heap, (scope_size(scope | other), k, new))
+        items[new] = (scope, (plan_i, plan_j))
+
+    _, (_, plan) = items.popitem()
+    return plan, cost
+
+
+def plan_optimal(scopes):
+    """
+    Plan the products of the factors with the given scopes such that the total
+    size of all the products is minimal, with dynamic programming over all the
+    subsets of the factors.
+    """
+    full = (1 << len(scopes)) - 1
+    best = {1 << index: (0, index) for index in range(len(scopes))}
+    union = {0: frozenset()}
+
+    for subset in range(1, full + 1):
+        low = subset & -subset
+        union[subset] = union[subset ^ low] | scopes[low.bit_length() - 1]
+        if subset == low:
+            continue
+
+        # split into two parts, the part with the lowest factor comes first
+        size = scope_size(union[subset])
+        part = (subset - 1) & subset
+        while part > 0:
+            if part & low:
+                cost = best[part][0] + best[subset ^ part][0] + size
+                if subset not in best or cost < best[subset][0]:
+                    best[subset] = (cost, (best[part][1], best[subset ^ part][1]))
+            part = (part - 1) & subset
+
+    cost, plan = best[full]
+    return plan, cost
+
+
+def plan_products(factors):
+    """
+    Plan the products of the factors with the strategy in product_order. An
+    empty bucket has no plan.
+    """
+    if len(factors) == 0:
+        return None, 0
+    scopes = [frozenset(factor.variables) for factor in factors]
+    if product_order == 'optimal' and len(factors) <= optimal_limit:
+        return plan_optimal(scopes)
+    return plan_greedy(scopes)
+
+
+def execute_plan(plan, factors):
+    """
+    Compute the product of the factors following the plan. The plan is walked
+    with an explicit stack, since a plan for a large bucket can be very deep.
+    Returns the product and the number of operations of the executed products.
+    """
+    results = []
+    actual = 0
+    stack = [(plan, False)]
+    while stack:
+        node, expanded = stack.pop()
+        if type(node) is int:
+            results.append(factors[node])
+        elif not expanded:
+            stack += [(node, True), (node[1], False), (node[0], False)]
+        else:
+            right = results.pop()
+            left = results.pop()
+            results.append(left.product(right))
+            actual += results[-1].operations
+    return results[0], actual
+
+
+def report_flops(predicted, actual, sink):
+    with flops_lock:
+        flops['predicted'] += predicted
+        flops['actual'] += actual
+    if sink is not None:
+        sink('flops', predicted = predicted, actual = actual)
+
+
+def multiply_final(factors, log = False):
+    """
+    Multiply all the given factors together. Without any factors, which happens
+    when all the query variables are observed, the product is the unit factor.
+    """
+
+    # the sink is read once, so a sink attached meanwhile gets no partial events
+    sink = util.sink
+    if sink is not None:
+        sink('multiply', factors = factors)
+        start = time.perf_counter()
+
+    # multiply the factors in the planned order
+    plan, predicted = plan_products(factors)
+    if plan is None:
+        final_factor, actual = Factor([], [0.0] if log else [1.0], log = log), 0
+    else:
+        final_factor, actual = execute_plan(plan, factors)
+    report_flops(predicted, actual, sink)
+
+    if sink is not None:
+        sink('timing', product = time.perf_counter() - start)
+        sink('product', factor = final_factor)
     return final_factor
 
 
@@ -140,71 +448,525 @@ def multiply(factors, variable):
         else:
             new_factors.append(factor)
 
-    # sort the factors based on size
-    product_factors.sort(key = lambda factor: len(factor.variables))
-
-    util.print_simple('Multiplying the following factors:\n')
-    util.print_factors_brief(product_factors)
-
-    # multiply the factors
-    final_factor = product_factors[0]
-    for factor in product_factors[1:]:
-        final_factor = final_factor.product(factor)
-
-    util.print_simple(f'Resulting in:\n')
-    util.print_factor_brief(final_factor)
-    return new_factors, final_factor
+    return new_factors, multiply_final(product_factors)
 
 
 def marginalize(factor, variable):
     marginalized_factor = factor.marginalize(variable)
 
-    util.print_simple(f'Marginalizing over {variable} gives:\n')
-    util.print_factor_brief(marginalized_factor)
+    if util.sink is not None:
+        util.sink('marginalize', variable = variable, factor = marginalized_factor)
 
     return marginalized_factor
 
 
-def ve(network, query, evidence, order = None):
+def marginalize_bucket(product_factors, variable):
     """
-    Use the variable elimination algorithm to find out the probability
-    distribution of the query variables given the observed variables.
+    Multiply the factors of a bucket, which all contain the given variable, and
+    marginalize the variable, without materializing the product of the factors.
+    """
+    sink = util.sink
+    if sink is not None:
+        sink('multiply', factors = product_factors, variable = variable)
+        start = time.perf_counter()
+
+    # multiply the factors in the planned order, the last product is fused
+    # with the marginalization
+    plan, predicted = plan_products(product_factors)
+    if type(plan) is int:
+        operands, actual = [product_factors[plan]], 0
+    else:
+        left, left_flops = execute_plan(plan[0], product_factors)
+        right, right_flops = execute_plan(plan[1], product_factors)
+        operands = [left, right]
+        actual = left_flops + right_flops
+
+    if sink is not None:
+        middle = time.perf_counter()
+    marginalized_factor = Factor.sum_product(operands, variable)
+    actual += marginalized_factor.operations
+
+    # the plan predicts the products, summing the last product adds an
+    # addition for every entry except the first one of every sum
+    scope = set().union(*(factor.variables for factor in product_factors))
+    predicted += scope_size(scope) - scope_size(scope - {variable})
+    report_flops(predicted, actual, sink)
+
+    # the fused final product counts as marginalization
+    if sink is not None:
+        sink('timing', product = middle - start, marginalize = time.perf_counter() - middle)
+        sink('product', factor = marginalized_factor)
+    return marginalized_factor
+
+
+class Buckets:
+    """
+    The factors of an elimination, every factor is kept in the bucket of its
+    first variable in the order, like in elimination_tree, so a step takes the
+    factors containing its variable from its bucket instead of going over all
+    the factors. The factors which are left keep the order they were added in.
     """
-    assert all(e in map(lambda v: v.name, network.variables) for e in evidence.keys())
-    assert all(q in map(lambda v: v.name, network.variables) for q in query)
 
-    # compute the barren variables
-    barren = init_barren(network.variables, query, evidence)
+    def __init__(self, factors, order):
+        self.position = {variable: index for index, variable in enumerate(order)}
+        self.buckets = [[] for _ in order]
+        self.left = {}
+        self.keys = itertools.count()
+        for factor in factors:
+            self.add(factor)
 
-    # determine the elimination order
-    order = init_order(network, query, evidence, barren, order)
 
-    # compute the nonbarren reduced factors
-    factors = init_factors(network, evidence, barren)
+    def add(self, factor):
+        key = next(self.keys)
+        self.left[key] = factor
+        first = min((self.position[other] for other in factor.variables if other in self.position),
+            default = None)
+        if first is not None:
+            self.buckets[first].append(key)
 
-    util.print_header(
-        f'Main loop of VE, going over all the variables\n'
-        f'Order: {order}')
-    util.print_factors_brief(factors)
 
-    for variable in order:
-        util.print_header(f'Processing variable {variable}')
+    def pop(self, index):
+        """Take out the factors containing the variable at the index of the order."""
+        return [self.left.pop(key) for key in self.buckets[index]]
 
-        # multiply all factors containing the variable under consideration
-        factors, multiplied_factor = multiply(factors, variable)
 
-        # marginalize the variable
-        factors.append(marginalize(multiplied_factor, variable))
+    def factors(self):
+        return list(self.left.values())
+
+
+def eliminate(factors, order, memo = None, silent = False):
+    """
+    Eliminate the variables in the given order from the factors. When a memo
+    dictionary is given the result of every step is stored under the ids of the
+    factors it multiplied, so a step on the exact same factors is reused. When
+    silent is set no events are sent and no flops are counted.
+    """
+    sink = util.sink if not silent else None
+
+    # the trace of the steps is only ordered when they run one at a time
+    if threads > 1 and sink is None and not silent:
+        return eliminate_parallel(factors, order, memo)
+
+    buckets = Buckets(factors, order)
+    for index, variable in enumerate(order):
+        if sink is not None:
+            sink('step', variable = variable)
+
+        bucket = buckets.pop(index)
+        key = (variable, frozenset(factor.id for factor in bucket))
+        marginalized_factor = memo.get(key) if memo is not None else None
+        if marginalized_factor is not None:
+            # reuse the marginalized factor of an identical step
+            if sink is not None:
+                sink('reuse', variable = variable, factor = marginalized_factor)
+        else:
+            # multiply all factors containing the variable and marginalize it
+            marginalized_factor = Factor.sum_product(bucket, variable) if silent else \
+                marginalize_bucket(bucket, variable)
+            if memo is not None:
+                memo[key] = marginalized_factor
+        buckets.add(marginalized_factor)
+
+        if sink is not None:
+            sink('factors', factors = buckets.factors())
 
-        util.print_simple('The new factors are:\n')
-        util.print_factors_brief(factors)
+    return buckets.factors()
 
-    util.print_header(f'Multiply the final factors')
-    factor = multiply_final(factors)
 
-    util.print_header(f'Normalization and final factor')
+# the number of threads eliminating independent variables at the same time
+threads = 1
+
+
+def elimination_tree(factors, order):
+    """
+    Build the elimination tree of the order. Every factor belongs to the bucket
+    of its first variable in the order, or to the remaining factors if it has
+    none. Eliminating the variable of a bucket gives a factor which belongs to
+    the bucket of its first variable in the order in the same way, which is the
+    parent of the bucket. Returns the buckets, the children of every bucket,
+    the buckets without a parent, the buckets grouped in levels, such that the
+    children of a bucket are in earlier levels than the bucket itself, and the
+    remaining factors.
+    """
+    position = {variable: index for index, variable in enumerate(order)}
+    buckets = [[] for _ in order]
+    remaining = []
+    for factor in factors:
+        first = min((position[variable] for variable in factor.variables if variable in position), default = None)
+        (remaining if first is None else buckets[first]).append(factor)
+
+    # follow the scopes of the eliminated factors through the order
+    scopes = [set().union(*(factor.variables for factor in bucket)) for bucket in buckets]
+    children = [[] for _ in order]
+    roots = []
+    height = [0] * len(order)
+    for index, variable in enumerate(order):
+        scope = scopes[index] - {variable}
+        parent = min((position[other] for other in scope if other in position), default = None)
+        if parent is None:
+            roots.append(index)
+        else:
+            scopes[parent] |= scope
+            children[parent].append(index)
+            height[parent] = max(height[parent], height[index] + 1)
+
+    levels = [[] for _ in range(max(height, default = -1) + 1)]
+    for index in range(len(order)):
+        levels[height[index]].append(index)
+    return buckets, children, roots, levels, remaining
+
+
+def eliminate_parallel(factors, order, memo = None):
+    """
+    Eliminate the variables in the given order like eliminate, but process the
+    buckets of the elimination tree level by level, with the buckets of a level
+    divided over a pool of threads. The buckets of a level share no factors, so
+    they are independent, and the products of large factors release the GIL.
+    Reused steps and the results are the same as for eliminate.
+    """
+    buckets, children, roots, levels, remaining = elimination_tree(factors, order)
+    messages = [None] * len(order)
+
+    def process(index):
+        variable = order[index]
+        bucket = buckets[index] + [messages[child] for child in children[index] if messages[child] is not None]
+        if len(bucket) == 0:
+            return None
+
+        key = (variable, frozenset(factor.id for factor in bucket))
+        marginalized_factor = memo.get(key) if memo is not None else None
+        if marginalized_factor is None:
+            marginalized_factor = marginalize_bucket(bucket, variable)
+            if memo is not None:
+                memo[key] = marginalized_factor
+        return marginalized_factor
+
+    with concurrent.futures.ThreadPoolExecutor(threads) as executor:
+        for level in levels:
+            for index, message in zip(level, executor.map(process, level)):
+                messages[index] = message
+
+    # the factors of the roots of the tree contain no eliminated variables
+    return remaining + [messages[index] for index in roots if messages[index] is not None]
+
+
+def ve(network, query, evidence, order = None, log = False):
+    """
+    Use the variable elimination algorithm to find out the probability
+    distribution of the query variables given the observed variables. The
+    reductions and elimination steps are shared with earlier calls through the
+    module cache. With log set the elimination runs in the log domain, which
+    avoids underflow when there is a lot of evidence, and only the normalized
+    final factor is converted back to probabilities.
+    """
+    assert all(e in network.variable_names for e in evidence.keys())
+    assert all(q in network.variable_names for q in query)
+
+    # compute the barren variables and all the other irrelevant variables
+    barren = init_barren(network.variables, query, evidence, network.relevance)
+    irrelevant = init_irrelevant(network.variables, query, evidence, barren, network.relevance)
+
+    # determine the elimination order
+    order = init_order(network, query, evidence, irrelevant, order)
+
+    # compute the relevant reduced factors
+    factors = init_factors(network, evidence, irrelevant, cache)
+    if log:
+        factors = init_log(factors, cache)
+
+    if util.sink is not None:
+        util.sink('loop', title = 'Main loop of VE, going over all the variables',
+            order = order, factors = factors)
+
+    factors = eliminate(factors, order, cache)
+
+    if util.sink is not None:
+        util.sink('header', title = 'Multiply the final factors')
+    factor = multiply_final(factors, log)
+
     factor = factor.normalize()
+    if log:
+        factor = factor.to_linear()
 
     # the final result of VE
-    util.print_factor(factor)
+    if util.sink is not None:
+        util.sink('result', factor = factor)
     return factor
+
+
+def ve_batch(network, queries, order = None):
+    """
+    Use the variable elimination algorithm to answer many queries at once, each
+    query is a pair of query variables and evidence. The queries are grouped on
+    their query and evidence variables, so the barren nodes and the elimination
+    order are computed once per group. Within a group the reductions and all the
+    elimination steps on factors which do not depend on the evidence values are
+    shared. The posterior factors are returned in the order of the queries.
+    """
+    names = network.ids.keys()
+    assert all(set(query) <= names and set(evidence) <= names for query, evidence in queries)
+
+    groups = {}
+    for index, (query, evidence) in enumerate(queries):
+        groups.setdefault((frozenset(query), frozenset(evidence)), []).append(index)
+
+    factors = [None] * len(queries)
+    for (query, evidence_names), indices in groups.items():
+        query = sorted(query)
+        evidence = queries[indices[0]][1]
+
+        # the irrelevant variables and the order only depend on the variables
+        barren = init_barren(network.variables, query, evidence, network.relevance)
+        irrelevant = init_irrelevant(network.variables, query, evidence, barren, network.relevance)
+        group_order = init_order(network, query, evidence, irrelevant, order)
+
+        # share the work through the module cache, or within the group without it
+        memo = cache if cache is not None else {}
+        for index in indices:
+            evidence = queries[index][1]
+            factor = multiply_final(eliminate(init_factors(network, evidence, irrelevant, memo), group_order, memo))
+
+            factors[index] = factor.normalize()
+            if util.sink is not None:
+                util.sink('result', factor = factors[index])
+
+    return factors
+
+
+def init_factors_batch(network, evidence, barren, batch):
+    """
+    Construct the nonbarren factors reduced for all the evidence rows at once,
+    along the axis of the batch variable. A factor over only the batch variable
+    is added, so the final factor has a batch axis even without any evidence.
+    """
+    barren = set(barren)
+    factors = {variable.id: network.factors[variable.id]
+        for variable in network.variables if variable not in barren}
+
+    for evidence_name in evidence[0].keys():
+        evidence_variable = network.name_to_variable(evidence_name)
+        values = [row[evidence_name] for row in evidence]
+        for index in [evidence_variable.id] + network.child_ids[evidence_variable.id]:
+            if index in factors:
+                factors[index] = factors[index].reduce_batch(batch, evidence_variable, values)
+
+    return list(factors.values()) + [Factor([batch], np.ones(len(evidence)))]
+
+
+def ve_evidence_batch(network, query, evidence, order = None):
+    """
+    Use the variable elimination algorithm to find out the probability
+    distribution of the query variables for many instantiations of the same
+    evidence variables, given as a list of evidence dictionaries. The rows are
+    indexed by an extra batch variable, which replaces the evidence variables in
+    the reduced factors, so a single elimination pass handles all the rows. The
+    result is an array with a row for every instantiation, containing the
+    probabilities of the sorted query variables in row-major order.
+    """
+    assert len(evidence) > 0
+    assert all(row.keys() == evidence[0].keys() for row in evidence)
+    assert all(e in network.variable_names for e in evidence[0].keys())
+    assert all(q in network.variable_names for q in query)
+
+    # the batch variable sorts before all names, so its axis comes first
+    batch = Variable('', range(len(evidence)))
+    assert batch.name not in network.variable_names
+
+    # compute the irrelevant variables and the order, which are shared by all rows
+    barren = init_barren(network.variables, query, evidence[0], network.relevance)
+    irrelevant = init_irrelevant(network.variables, query, evidence[0], barren, network.relevance)
+    order = init_order(network, query, evidence[0], irrelevant, order)
+
+    # the factors reduced for all the rows at once
+    factors = init_factors_batch(network, evidence, irrelevant, batch)
+
+    if util.sink is not None:
+        util.sink('reduced_batch', rows = len(evidence), factors = factors)
+        util.sink('loop', title = 'Main loop of VE, going over all the variables', order = order)
+    factor = multiply_final(eliminate(factors, order))
+
+    # normalize every row separately
+    table = factor.table.reshape(len(evidence), -1)
+    return table / table.sum(axis = 1, keepdims = True)
+
+
+def probability_of_evidence(network, evidence, order = None):
+    """
+    Compute the probability of the evidence by summing out all the unobserved
+    variables in the given order, without any output or normalization. The
+    evidence is either a dictionary, giving a float, or a list of dictionaries,
+    giving an array with the probability of every dictionary. A list is grouped
+    on the evidence variables and every group is handled in a single batched
+    elimination pass.
+    """
+    if type(evidence) is dict:
+        return float(probability_of_evidence(network, [evidence], order)[0])
+
+    groups = {}
+    for index, row in enumerate(evidence):
+        assert all(e in network.variable_names for e in row.keys())
+        groups.setdefault(frozenset(row), []).append(index)
+
+    probabilities = np.empty(len(evidence))
+    for indices in groups.values():
+        rows = [evidence[index] for index in indices]
+        batch = Variable('', range(len(rows)))
+
+        # all the variables which are not ancestors of the evidence sum out to one
+        barren = find_barren(network.variables, [], rows[0], network.relevance)
+        group_order = find_order(network, [], rows[0], barren, order)
+
+        # the steps on factors without evidence are shared through the module cache
+        factors = init_factors_batch(network, rows, barren, batch)
+        factors = eliminate(factors, group_order, cache, silent = True)
+
+        # only factors over the batch variable or without variables are left
+        table = np.ones(len(rows))
+        for factor in factors:
+            table = table * factor.table
+        probabilities[indices] = table
+
+    return probabilities
+
+
+def maximize_bucket(product_factors, variable):
+    """
+    Multiply the factors of a bucket, which all contain the given variable, and
+    maximize over the variable, the result keeps the back pointers to the
+    maximizing values.
+    """
+    sink = util.sink
+    product_factor = multiply_final(product_factors)
+
+    if sink is not None:
+        start = time.perf_counter()
+    maximized_factor = product_factor.maximize(variable)
+
+    if sink is not None:
+        sink('timing', marginalize = time.perf_counter() - start)
+        sink('maximize', variable = variable, factor = maximized_factor)
+    return maximized_factor
+
+
+def max_eliminate(factors, order):
+    """
+    Eliminate the variables in the given order from the factors by maximizing,
+    taking the factors of every step from its bucket like eliminate. Returns
+    the remaining factors and the maximized factors of all the steps.
+    """
+    sink = util.sink
+    steps = []
+    buckets = Buckets(factors, order)
+    for index, variable in enumerate(order):
+        if sink is not None:
+            sink('step', variable = variable)
+
+        maximized_factor = maximize_bucket(buckets.pop(index), variable)
+        buckets.add(maximized_factor)
+        steps.append(maximized_factor)
+
+        if sink is not None:
+            sink('factors', factors = buckets.factors())
+
+    return buckets.factors(), steps
+
+
+def traceback(steps):
+    """
+    Find the maximizing assignment by going backwards over the maximization
+    steps. The back pointers of every step only depend on variables which were
+    maximized later, so their values are known when the step is reached.
+    """
+    assignment = {}
+    for factor in reversed(steps):
+        variable, pointers = factor.backpointer
+        index = tuple(other.domain.index(assignment[other.name]) for other in factor.variables)
+        assignment[variable.name] = variable.domain[pointers[index]]
+    return assignment
+
+
+def final_probability(factors, log):
+    """Multiply the factors without variables left into a single probability."""
+    factor = multiply_final(factors, log)
+    assert len(factor.variables) == 0
+    value = factor.values[0]
+    return math.exp(value) if log else value
+
+
+def mpe(network, evidence, order = None, log = False):
+    """
+    Find the most probable explanation: the assignment to all the unobserved
+    variables with the highest probability together with the evidence. Returns
+    the assignment and the joint probability of the assignment and the evidence.
+    """
+    assert all(e in network.variable_names for e in evidence.keys())
+
+    # barren variables are not irrelevant when maximizing, so nothing is pruned
+    if util.sink is not None:
+        util.sink('setup', algorithm = 'MPE', query = [], evidence = evidence, barren = [])
+    order = init_order(network, [], evidence, [], order)
+
+    factors = init_factors(network, evidence, [], cache)
+    if log:
+        factors = init_log(factors, cache)
+
+    if util.sink is not None:
+        util.sink('loop', title = 'Main loop of MPE, going over all the variables',
+            order = order, factors = factors)
+    factors, steps = max_eliminate(factors, order)
+
+    if util.sink is not None:
+        util.sink('header', title = 'Multiply the final factors')
+    probability = final_probability(factors, log)
+    assignment = traceback(steps)
+
+    if util.sink is not None:
+        util.sink('assignment', title = 'Most probable explanation',
+            assignment = assignment, probability = probability)
+    return assignment, probability
+
+
+def map(network, query, evidence, order = None, log = False):
+    """
+    Find the maximum a posteriori assignment to the query variables: the other
+    unobserved variables are summed out first, in the given order, after which
+    the query variables are maximized. Returns the assignment and the joint
+    probability of the assignment and the evidence. An observed query variable
+    is assigned its observed value.
+    """
+    assert all(e in network.variable_names for e in evidence.keys())
+    assert all(q in network.variable_names for q in query)
+
+    # the observed query variables have no factor left to maximize over
+    observed = {name: evidence[name] for name in query if name in evidence}
+    query = [name for name in query if name not in evidence]
+
+    # compute the barren variables, which sum out to one
+    barren = init_barren(network.variables, query, evidence, network.relevance)
+
+    # determine the elimination order of the summed variables
+    order = init_order(network, query, evidence, barren, order)
+
+    factors = init_factors(network, evidence, barren, cache)
+    if log:
+        factors = init_log(factors, cache)
+
+    if util.sink is not None:
+        util.sink('loop', title = 'Main loop of MAP, summing out the variables',
+            order = order, factors = factors)
+    factors = eliminate(factors, order, cache)
+
+    if util.sink is not None:
+        util.sink('header', title = 'Maximizing over the query variables')
+    query = sorted(network.name_to_variable(name) for name in query)
+    factors, steps = max_eliminate(factors, query)
+
+    if util.sink is not None:
+        util.sink('header', title = 'Multiply the final factors')
+    probability = final_probability(factors, log)
+    assignment = {**traceback(steps), **observed}
+
+    if util.sink is not None:
+        util.sink('assignment', title = 'Maximum a posteriori assignment',
+            assignment = assignment, probability = probability)
+    return assignment, probability
@@ -1,53 +1,68 @@
 import itertools
 import math
-import pandas
+import numpy as np
+
+
+def logsumexp(table, axis = None):
+    """Compute log(sum(exp(table))) along the axis without overflow or underflow."""
+    shift = np.asarray(np.max(table, axis = axis, keepdims = True))  # np.max gives a scalar for a table without axes
+    shift[~np.isfinite(shift)] = 0  # all values are -inf, or there is an inf
+    with np.errstate(divide = 'ignore'):
+        total = np.log(np.sum(np.exp(table - shift), axis = axis, keepdims = True)) + shift
+    return np.squeeze(total, axis = axis) if axis is not None else total.reshape(())
 
 
 class Factor:
 
-    uid = 0
+    # the ids of the factors, taking the next id is atomic so threads never share one
+    uid = itertools.count()
 
-    def __init__(self, variables, values, reduced = []):
+    def __init__(self, variables, values, reduced = [], log = False):
         assert variables == sorted(variables)
 
         self.variables = variables
-        self.values = values
         self.reduced = reduced  # all variables that got reduced
+        self.log = log  # whether the values are the logarithms of the probabilities
+        self.backpointer = None  # the maximized variable and its maximizing value indices
+        self.operations = 0  # the elementwise operations which computed the values
 
-        self.id = Factor.uid
-        Factor.uid += 1
+        # the values are stored in a contiguous table with one axis per variable
+        shape = tuple(len(variable.domain) for variable in variables)
+        self.table = np.ascontiguousarray(values, dtype = np.float64).reshape(shape)
 
+        self.id = next(Factor.uid)
 
-    def clone(self):
-        return Factor(self.variables, self.values.copy())
 
+    @property
+    def values(self):
+        """The values of the factor as a flat list in row-major order."""
+        return self.table.ravel().tolist()
 
-    def normalize(self):
-        total = sum(self.values)
-        values = [value / total for value in self.values]
-        return Factor(self.variables, values, self.reduced.copy())
 
+    def clone(self):
+        return Factor(self.variables, self.table.copy(), log = self.log)
 
-    def _chunk_info(self, variable):
-        """
-        Give information about a chunk, where a chunk is a grouping of values
-        from a domain in a column, possibly of size 1. We provide the number of
-        chunks there are for all the values of the given variable, the size of
-        these chunks and the space between two chunks.
-        """
-        # find the index of the variable in the corresponding list
-        variable_index = self.variables.index(variable)
 
-        # the number of chunks there are for every variable set
-        chunk_num = math.prod(len(variable.domain) for variable in self.variables[:variable_index])
+    def to_log(self):
+        """Convert the factor to the log domain, zeros become -inf."""
+        assert not self.log
+        with np.errstate(divide = 'ignore'):
+            table = np.log(self.table)
+        return Factor(self.variables, table, self.reduced.copy(), True)
 
-        # the size of the chunks for every variable set
-        chunk_size = math.prod(len(variable.domain) for variable in self.variables[variable_index + 1:])
 
-        # the space between two chunks
-        jump = chunk_size * (len(variable.domain) - 1)
+    def to_linear(self):
+        """Convert the factor from the log domain back to probabilities."""
+        assert self.log
+        return Factor(self.variables, np.exp(self.table), self.reduced.copy())
 
-        return chunk_num, chunk_size, jump
+
+    def normalize(self):
+        if self.log:
+            table = self.table - logsumexp(self.table)
+        else:
+            table = self.table / self.table.sum()
+        return Factor(self.variables, table, self.reduced.copy(), self.log)
 
 
     def marginalize(self, variable):
@@ -55,18 +70,36 @@ class Factor:
         assert variable in self.variables
         assert len(self.variables) > 0
 
-        chunk_num, chunk_size, jump = self._chunk_info(variable)
+        # sum out the axis corresponding to the variable
+        axis = self.variables.index(variable)
+        table = logsumexp(self.table, axis) if self.log else self.table.sum(axis = axis)
+
+        # create the new variables list and factor, every entry of the table
+        # except the first one of every sum is an addition
+        variables = [other for other in self.variables if other != variable]
+        factor = Factor(variables, table, self.reduced.copy(), self.log)
+        factor.operations = self.table.size - table.size
+        return factor
 
-        # create the new values list
-        values = []
-        for chunk in range(0, len(self.values), chunk_size + jump):
-            for i in range(chunk_size):
-                values.append(sum(self.values[chunk + d * chunk_size + i]
-                    for d in range(len(variable.domain))))
+
+    def maximize(self, variable):
+        """
+        Perform maximization on the factor for the given variable. The indices
+        of the maximizing values of the variable are kept as back pointers in a
+        table over the remaining variables.
+        """
+        assert variable in self.variables
+
+        # take the maximum along the axis corresponding to the variable
+        axis = self.variables.index(variable)
+        pointers = np.argmax(self.table, axis = axis)
+        table = np.take_along_axis(self.table, np.expand_dims(pointers, axis), axis).squeeze(axis)
 
         # create the new variables list and factor
         variables = [other for other in self.variables if other != variable]
-        return Factor(variables, values, self.reduced.copy())
+        factor = Factor(variables, table, self.reduced.copy(), self.log)
+        factor.backpointer = (variable, pointers)
+        return factor
 
 
     def reduce(self, variable, value):
@@ -74,73 +107,114 @@ class Factor:
         assert variable in self.variables
         assert value in variable.domain
 
-        chunk_num, chunk_size, jump = self._chunk_info(variable)
-
-        # find the index of the value in the corresponding lists
+        # select the slice of the axis corresponding to the value
         value_index = variable.domain.index(value)
-
-        # create the new values list
-        values = []
-        for chunk in range(chunk_size * value_index, len(self.values), chunk_size + jump):
-            for i in range(chunk_size):
-                values.append(self.values[chunk + i])
+        table = np.take(self.table, value_index, axis = self.variables.index(variable))
 
         # create the new variables list and factor
         variables = [other for other in self.variables if other != variable]
-        return Factor(variables, values, self.reduced.copy() + [variable])
+        return Factor(variables, table, self.reduced.copy() + [variable], self.log)
 
 
-    def _product_reduced(reduced_factor, factor):
-        """Compute the product when at least one factor is completely reduced."""
-        values = list(map(lambda value: value * reduced_factor.values[0], factor.values))
-        reduced = sorted(list(set(reduced_factor.reduced.copy() + factor.reduced.copy())))
-        return Factor(factor.variables.copy(), values, reduced)
+    def reduce_batch(self, batch, variable, values):
+        """
+        Perform a reduction for every value in the given list at once. The
+        results are stacked along the axis of the batch variable, whose domain
+        indexes the list. If the factor already has a batch axis, every entry
+        along it is reduced with its own value.
+        """
+        assert variable in self.variables
+        assert len(values) == len(batch.domain)
+
+        # the indices of the values in the domain of the variable
+        positions = {value: index for index, value in enumerate(variable.domain)}
+        indices = np.array([positions[value] for value in values])
+        axis = self.variables.index(variable)
+
+        variables = sorted(set(self.variables + [batch]) - {variable})
+        if batch in self.variables:
+            # select a value along the axis of the variable for every batch entry
+            shape = [1] * len(self.variables)
+            shape[self.variables.index(batch)] = len(values)
+            table = np.take_along_axis(self.table, indices.reshape(shape), axis).squeeze(axis)
+        else:
+            # the axis of the variable becomes the batch axis
+            table = np.moveaxis(np.take(self.table, indices, axis), axis, variables.index(batch))
+
+        return Factor(variables, table, self.reduced.copy() + [variable], self.log)
+
+
+    def _broadcast(self, variables, shape):
+        """
+        View the table of this factor over the given (larger) sorted variables.
+        Every axis of a variable that is not in this factor gets a stride of
+        zero, so walking the view repeats the values without copying them.
+        """
+        strides = dict(zip(self.variables, self.table.strides))
+        strides = tuple(strides.get(variable, 0) for variable in variables)
+        return np.lib.stride_tricks.as_strided(self.table, shape, strides, writeable = False)
 
 
     def product(self, othr):
         """Compute the product factor of this factor and the given factor."""
 
-        # simplify if at least one of the factors is completely reduced
-        if len(self.variables) == 0:
-            return Factor._product_reduced(self, othr)
-        if len(othr.variables) == 0:
-            return Factor._product_reduced(othr, self)
-
-        # create the final product table entries without the probabilities
+        # the product is defined over the union of both variable lists
         variables = sorted(list(set(self.variables + othr.variables)))
-        rows = list(itertools.product(*map(lambda variable: variable.domain, variables)))
-
-        # the masks are used to get an assignment for indexing the factors
-        mask_self = [variable in self.variables for variable in variables]
-        mask_othr = [variable in othr.variables for variable in variables]
-
-        # convert an ordered assignment of values to an index in the factor
-        def assignment_to_index(factor, assignment):
-            index = 0
-            size = 1
-            for i in range(len(factor.variables) - 1, -1, -1):
-                index += size * factor.variables[i].domain.index(assignment[i])
-                size *= len(factor.variables[i].domain)
-            return index
-
-        # create the new values list
-        values = []
-        for row in rows:
-            # get the value assignments, i.e. the rows for the factor tables
-            assignment_self = list(itertools.compress(row, mask_self))
-            assignment_othr = list(itertools.compress(row, mask_othr))
-
-            # assignment to index in factors
-            index_self = assignment_to_index(self, assignment_self)
-            index_othr = assignment_to_index(othr, assignment_othr)
-
-            # calculate the new value
-            value = self.values[index_self] * othr.values[index_othr]
-            values.append(value)
+        shape = tuple(len(variable.domain) for variable in variables)
+
+        # walk both tables with precomputed strides and multiply elementwise,
+        # which means adding the values in the log domain
+        assert self.log == othr.log
+        operation = np.add if self.log else np.multiply
+        table = operation(self._broadcast(variables, shape), othr._broadcast(variables, shape))
 
         # create the combined reduced list and factor
         reduced = sorted(list(set(self.reduced.copy() + othr.reduced.copy())))
-        return Factor(variables, values, reduced)
+        factor = Factor(variables, table, reduced, self.log)
+        factor.operations = table.size
+        return factor
+
+
+    @staticmethod
+    def sum_product(factors, variable):
+        """
+        Compute the product of the factors and marginalize the variable in one
+        step. The sum is accumulated directly into the resulting table, so the
+        product over all the variables is never materialized. The operations of
+        the result count the operations of the path which was taken.
+        """
+        assert any(variable in factor.variables for factor in factors)
+
+        variables = sorted(set(other for factor in factors for other in factor.variables))
+        reduced = sorted(set(other for factor in factors for other in factor.reduced))
+        log = factors[0].log
+        assert all(factor.log == log for factor in factors)
+
+        # einsum only has labels for 52 axes and a fused product in the log
+        # domain could underflow, so fall back to a product in these cases
+        if len(variables) > 52 or log:
+            product, operations = factors[0], 0
+            for factor in factors[1:]:
+                product = product.product(factor)
+                operations += product.operations
+            result = product.marginalize(variable)
+            result.operations += operations
+            return result
+
+        labels = {other: label for label, other in enumerate(variables)}
+        operands = []
+        for factor in factors:
+            operands += [factor.table, [labels[other] for other in factor.variables]]
+
+        variables = [other for other in variables if other != variable]
+        table = np.einsum(*operands, [labels[other] for other in variables])
+
+        # every entry of the product multiplies all the factors and is added
+        # to its sum, except the first one of every sum
+        result = Factor(variables, table, reduced)
+        size = math.prod(len(other.domain) for other in labels)
+        result.operations = (len(factors) - 1) * size + size - table.size
+        return result
 
 
     def brief(self):
@@ -150,11 +224,14 @@ class Factor:
 
 
     def __str__(self):
+        import pandas  # only needed for displaying the table
+
         domains = list(map(lambda variable: variable.domain, self.variables))
         table = []
-        for index, row in enumerate(itertools.product(*domains)):
-            table.append(list(row) + [self.values[index]])
+        for row, value in zip(itertools.product(*domains), self.values):
+            table.append(list(row) + [value])
 
-        table = str(pandas.DataFrame(table, columns = list(map(str, self.variables)) + ['prob']))
+        column = 'log prob' if self.log else 'prob'
+        table = str(pandas.DataFrame(table, columns = list(map(str, self.variables)) + [column]))
         table = f'f{self.id:02}, variables: {self.variables}, reduced: {self.reduced}\n{table}\n'
         return table
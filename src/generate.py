@@ -0,0 +1,164 @@
+"""
+Generate synthetic Bayesian networks for scale testing. A structure is given
+by the parents of every variable by name, the domains and the probability
+tables are drawn at random. The same structure, domain sizes and seed give the
+same network, whether it is written to a .bif file or built in memory.
+"""
+
+from network import Network
+
+import argparse
+import itertools
+import random
+
+
+def chain(n):
+    """The parents of a chain of n variables, every variable has the previous one as parent."""
+    return {f'X{i}': [f'X{i - 1}'] if i > 0 else [] for i in range(n)}
+
+
+def grid(rows, columns):
+    """
+    The parents of a grid of variables, every variable has the variables above
+    and to the left of it as parents. The treewidth is min(rows, columns).
+    """
+    parents = {}
+    for row, column in itertools.product(range(rows), range(columns)):
+        parents[f'X{row}_{column}'] = \
+            ([f'X{row - 1}_{column}'] if row > 0 else []) + \
+            ([f'X{row}_{column - 1}'] if column > 0 else [])
+    return parents
+
+
+def ladder(n):
+    """The parents of a ladder of two rows of n variables, a grid with treewidth 2."""
+    return grid(2, n)
+
+
+def polytree(n, in_degree, seed = 0):
+    """
+    The parents of a random polytree of n variables, a graph without cycles
+    even when the directions of the edges are ignored. Every variable is
+    connected to a random earlier variable, either as its child or as one of
+    its at most in_degree parents.
+    """
+    rng = random.Random(seed)
+    parents = {f'X{i}': [] for i in range(n)}
+    for i in range(1, n):
+        j = rng.randrange(i)
+        if len(parents[f'X{j}']) < in_degree and rng.random() < 0.5:
+            parents[f'X{j}'].append(f'X{i}')
+        else:
+            parents[f'X{i}'].append(f'X{j}')
+    return parents
+
+
+def random_dag(n, in_degree, width, seed = 0):
+    """
+    The parents of a random directed acyclic graph of n variables. Every
+    variable gets up to in_degree parents chosen from the width variables
+    before it, so the treewidth is at most width.
+    """
+    rng = random.Random(seed)
+    parents = {}
+    for i in range(n):
+        window = range(max(0, i - width), i)
+        parents[f'X{i}'] = [f'X{j}' for j in sorted(rng.sample(window, min(in_degree, len(window))))]
+    return parents
+
+
+def structure(kind, n, in_degree = 2, treewidth = 2, seed = 0):
+    """
+    The parents of a structure of about n variables of the given kind: 'chain',
+    'ladder', 'grid' with treewidth rows, 'polytree' or 'random-dag' with the
+    given maximum in-degree and a treewidth of at most treewidth.
+    """
+    if kind == 'chain':
+        return chain(n)
+    if kind == 'ladder':
+        return ladder(n // 2)
+    if kind == 'grid':
+        return grid(treewidth, n // treewidth)
+    if kind == 'polytree':
+        return polytree(n, in_degree, seed)
+    if kind == 'random-dag':
+        return random_dag(n, in_degree, treewidth, seed)
+    raise ValueError(f'unknown structure {kind!r}')
+
+
+def domains(parents, domain_size = 2, seed = 0):
+    """
+    The domain of every variable. The domain size is either a number, a list
+    of sizes to choose from uniformly or a dictionary from sizes to weights.
+    """
+    rng = random.Random(seed)
+    if type(domain_size) is int:
+        sizes = [domain_size] * len(parents)
+    elif type(domain_size) is dict:
+        sizes = rng.choices(list(domain_size), weights = list(domain_size.values()), k = len(parents))
+    else:
+        sizes = rng.choices(domain_size, k = len(parents))
+    return {name: [f's{index}' for index in range(size)] for name, size in zip(parents, sizes)}
+
+
+def tables(parents, domains, seed = 0):
+    """
+    The random probability tables of the variables, as rows with the values of
+    the parents and the probabilities for each value, like InternalNetwork.
+    """
+    rng = random.Random(seed)
+    tables = {}
+    for name, domain in domains.items():
+        tables[name] = []
+        for values in itertools.product(*[domains[parent] for parent in parents[name]]):
+            weights = [rng.random() + 1e-3 for _ in domain]
+            total = sum(weights)
+            tables[name].append((list(values), [weight / total for weight in weights]))
+    return tables
+
+
+def write_bif(filename, parents, domain_size = 2, seed = 0):
+    """Write a network with the given parents and random tables to a .bif file."""
+    values = domains(parents, domain_size, seed)
+
+    with open(filename, 'w') as file:
+        file.write('network unknown {\n}\n')
+        for name, domain in values.items():
+            file.write(f'variable {name} {{\n'
+                f'  type discrete [ {len(domain)} ] {{ {", ".join(domain)} }};\n}}\n')
+
+        for name, rows in tables(parents, values, seed).items():
+            given = f' | {", ".join(parents[name])}' if parents[name] else ''
+            file.write(f'probability ( {name}{given} ) {{\n')
+            for parent_values, probs in rows:
+                probs = ', '.join(map(repr, probs))
+                if parents[name]:
+                    file.write(f'  ({", ".join(parent_values)}) {probs};\n')
+                else:
+                    file.write(f'  table {probs};\n')
+            file.write('}\n')
+
+
+def network(parents, domain_size = 2, seed = 0):
+    """
+    Build a network with the given parents and random tables in memory, the
+    same network as parsing the .bif file written by write_bif.
+    """
+    values = domains(parents, domain_size, seed)
+    return Network.from_tables(values, parents, tables(parents, values, seed))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Write a synthetic network to a .bif file.')
+    parser.add_argument('kind', choices = ['chain', 'ladder', 'grid', 'polytree', 'random-dag'])
+    parser.add_argument('n', type = int, help = 'the number of variables')
+    parser.add_argument('filename')
+    parser.add_argument('--in-degree', type = int, default = 2)
+    parser.add_argument('--treewidth', type = int, default = 2)
+    parser.add_argument('--domain-size', type = int, nargs = '+', default = [2],
+        help = 'the domain sizes to choose from uniformly')
+    parser.add_argument('--seed', type = int, default = 0)
+    arguments = parser.parse_args()
+
+    parents = structure(arguments.kind, arguments.n, arguments.in_degree, arguments.treewidth, arguments.seed)
+    write_bif(arguments.filename, parents, arguments.domain_size, arguments.seed)
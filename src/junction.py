@@ -0,0 +1,252 @@
+from factor import Factor
+import ordering
+import util
+
+
+def sum_out(factor, variables):
+    """Marginalize all the given variables which are in the factor."""
+    for variable in variables:
+        if variable in factor.variables:
+            factor = factor.marginalize(variable)
+    return factor
+
+
+def product(factors):
+    """Multiply all the given factors together, starting from the unit factor."""
+    result = Factor([], [1.0])
+    for factor in sorted(factors, key = lambda factor: len(factor.variables)):
+        result = result.product(factor)
+    return result
+
+
+class JunctionTree:
+    """
+    A junction tree (clique tree) compiled from a network. The moral graph is
+    triangulated by eliminating all the variables in the given order, the
+    cliques of this elimination form the nodes of the tree and every factor of
+    the network is assigned to a clique containing its variables. The tree is
+    calibrated with Shafer-Shenoy message passing, after which every marginal
+    can be read from a single clique. The compiled tree is reused for any
+    evidence given to calibrate.
+    """
+
+    def __init__(self, network, order = 'min-fill'):
+        self.network = network
+
+        # triangulate the moral graph of the whole network
+        graph = ordering.interaction_graph(network.variables, {}, [])
+        if type(order) is str:
+            order = ordering.greedy_order(graph, list(graph), order)
+        else:
+            order = list(map(network.name_to_variable, order))
+        assert sorted(order) == network.variables
+
+        self._build_cliques(graph, order)
+        self._contract()
+
+        # every factor belongs to the clique of its first eliminated variable
+        self.potentials = [[] for _ in self.cliques]
+        for factor in network.factors:
+            first = min(factor.variables, key = self.position.get)
+            self.potentials[self.owner[first]].append(factor)
+        self.potentials = [product(factors) for factors in self.potentials]
+
+        self.evidence = {}
+        self.messages = {}
+        self.beliefs = {}
+
+        if util.sink is not None:
+            util.sink('junction_tree', cliques = self.cliques, neighbours = self.neighbours)
+
+
+    def _build_cliques(self, graph, order):
+        """
+        Eliminate the variables in order, which creates a clique for every
+        variable. The clique of a variable is connected to the clique of the
+        first variable eliminated after it among its neighbours, the cliques
+        without such a variable are the roots of the trees in the forest.
+        """
+        graph = {variable: set(neighbours) for variable, neighbours in graph.items()}
+        self.position = {variable: index for index, variable in enumerate(order)}
+
+        self.cliques = []
+        for variable in order:
+            neighbours = graph.pop(variable)
+            for other in neighbours:
+                graph[other].discard(variable)
+                graph[other].update(neighbours - {other})
+            self.cliques.append(frozenset(neighbours | {variable}))
+
+        self.neighbours = [set() for _ in self.cliques]
+        roots = []
+        for index, variable in enumerate(order):
+            rest = self.cliques[index] - {variable}
+            if len(rest) == 0:
+                roots.append(index)
+                continue
+            parent = self.position[min(rest, key = self.position.get)]
+            self.neighbours[index].add(parent)
+            self.neighbours[parent].add(index)
+
+        # connect the trees of a forest with empty separators
+        for root in roots[1:]:
+            self.neighbours[root].add(roots[0])
+            self.neighbours[roots[0]].add(root)
+
+        # the clique which contains every variable and its earlier neighbours
+        self.owner = {variable: index for index, variable in enumerate(order)}
+
+
+    def _contract(self):
+        """
+        Remove the cliques which are not maximal. Because of the running
+        intersection property such a clique is a subset of one of its
+        neighbours, so it is merged into that neighbour.
+        """
+        alive = [True] * len(self.cliques)
+        merged = list(range(len(self.cliques)))
+
+        # a clique has to be checked again when it gets new neighbours
+        stack = list(range(len(self.cliques) - 1, -1, -1))
+        while stack:
+            index = stack.pop()
+            if not alive[index]:
+                continue
+            for other in self.neighbours[index]:
+                if self.cliques[index] <= self.cliques[other]:
+                    for neighbour in self.neighbours[index] - {other}:
+                        self.neighbours[neighbour].discard(index)
+                        self.neighbours[neighbour].add(other)
+                        self.neighbours[other].add(neighbour)
+                        stack.append(neighbour)
+                    self.neighbours[other].discard(index)
+                    alive[index] = False
+                    merged[index] = other
+                    break
+
+        # follow the merges to find the clique every removed clique ended up in
+        def find(index):
+            while merged[index] != index:
+                index = merged[index]
+            return index
+
+        # renumber the remaining cliques
+        renumber = {}
+        for index in range(len(self.cliques)):
+            if alive[index]:
+                renumber[index] = len(renumber)
+        self.cliques = [clique for index, clique in enumerate(self.cliques) if alive[index]]
+        self.neighbours = [{renumber[other] for other in neighbours}
+            for index, neighbours in enumerate(self.neighbours) if alive[index]]
+        self.owner = {variable: renumber[find(index)] for variable, index in self.owner.items()}
+
+
+    def separator(self, i, j):
+        return self.cliques[i] & self.cliques[j]
+
+
+    def _local(self, index):
+        """The factors in the clique: its potential and the evidence indicators."""
+        return [self.potentials[index]] + [indicator for variable, indicator in self.evidence.items()
+            if self.owner[variable] == index]
+
+
+    def _message(self, i, j):
+        """Compute the message from clique i to clique j."""
+        factors = self._local(i) + [self.messages[(k, i)] for k in self.neighbours[i] if k != j]
+        message = sum_out(product(factors), self.cliques[i] - self.separator(i, j))
+
+        # scale the message to avoid underflow, this does not change the marginals
+        total = message.table.sum()
+        return message.normalize() if total > 0 else message
+
+
+    def _schedule(self, root = 0):
+        """
+        Order the directed edges away from the root, in breadth first order.
+        Sending the messages along the reversed edges in reverse order collects
+        all information in the root, sending them in order distributes it.
+        """
+        edges = []
+        visited = {root}
+        frontier = [root]
+        for i in frontier:
+            for j in sorted(self.neighbours[i]):
+                if j not in visited:
+                    visited.add(j)
+                    frontier.append(j)
+                    edges.append((i, j))
+        return edges
+
+
+    def indicator(self, variable, value):
+        """The evidence indicator factor of the variable for the observed value."""
+        assert value in variable.domain
+        return Factor([variable], [float(other == value) for other in variable.domain])
+
+
+    def set_evidence(self, evidence):
+        """Replace the evidence by indicator factors for the observed values."""
+        self.evidence = {}
+        for name, value in evidence.items():
+            variable = self.network.name_to_variable(name)
+            self.evidence[variable] = self.indicator(variable, value)
+
+
+    def collect(self, root):
+        """Compute the messages towards the root which are not cached yet."""
+        for i, j in reversed(self._schedule(root)):
+            if (j, i) not in self.messages:
+                self.messages[(j, i)] = self._message(j, i)
+
+
+    def invalidate(self, index):
+        """
+        Remove the cached messages which depend on the factors of the clique at
+        the index, which are all the messages directed away from it. A message
+        can only be cached if the messages it depends on are, so the search
+        stops at messages which are missing already.
+        """
+        frontier = [(None, index)]
+        for parent, i in frontier:
+            for j in self.neighbours[i]:
+                if j != parent and self.messages.pop((i, j), None) is not None:
+                    frontier.append((i, j))
+        self.beliefs = {}
+
+
+    def calibrate(self, evidence = {}):
+        """Calibrate the tree for the given evidence with two passes of messages."""
+        if util.sink is not None:
+            util.sink('calibrate', evidence = evidence)
+
+        self.set_evidence(evidence)
+        self.messages = {}
+        self.beliefs = {}
+
+        schedule = self._schedule()
+        for i, j in reversed(schedule):
+            self.messages[(j, i)] = self._message(j, i)
+        for i, j in schedule:
+            self.messages[(i, j)] = self._message(i, j)
+
+
+    def belief(self, index):
+        """The unnormalized belief of a clique, given all incoming messages."""
+        if index not in self.beliefs:
+            factors = self._local(index) + [self.messages[(k, index)] for k in self.neighbours[index]]
+            self.beliefs[index] = product(factors)
+        return self.beliefs[index]
+
+
+    def marginal(self, name):
+        """The posterior distribution of the given variable."""
+        variable = self.network.name_to_variable(name)
+        index = self.owner[variable]
+        factor = sum_out(self.belief(index), self.cliques[index] - {variable})
+        return factor.normalize()
+
+
+    def marginals(self):
+        """The posterior distributions of all the variables by name."""
+        return {variable.name: self.marginal(variable.name) for variable in self.network.variables}
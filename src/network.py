@@ -1,62 +1,257 @@
 from variable import Variable
 from factor import Factor
 
-import pandas as pd
+import hashlib
+import itertools
+import json
+import math
+import mmap
+import numpy as np
+import os
+import re
+import struct
 
 
 class Network:
 
-    def __init__(self, filename):
+    # the compiled networks are cached in this directory next to the .bif file
+    cache_directory = '__bifcache__'
+
+    # the version of the format of a compiled network, a compiled network of
+    # another version is never read since the version is part of its path
+    version = 1
+
+    # the first bytes of a compiled network, including the format version
+    magic = b'VENET\x00\x00' + bytes([version])
+
+
+    def __init__(self, filename, cache = True):
+        # reuse the compiled network if the .bif file did not change
+        path = Network.cache_path(filename) if cache else None
+        if path is not None and os.path.exists(path):
+            try:
+                self._read(path)
+                return
+            except (OSError, ValueError, KeyError, struct.error):
+                pass  # a corrupt compiled network is parsed again and overwritten
+
         # use the provided network for parsing the .bif file
-        self._network = InternalNetwork(filename)
+        parsed = InternalNetwork(filename)
+        self._build(parsed.values, parsed.parents, parsed.tables)
+
+        if path is not None:
+            try:
+                self.save(path)
+                Network.remove_stale(filename, path)
+            except OSError:
+                pass  # the cache is only an optimization
+
+
+    @staticmethod
+    def cache_path(filename):
+        """
+        Get the path of the compiled network for the given .bif file. The path
+        contains the hash of the contents of the file and the format version,
+        so a changed file or format never reuses a stale compiled network.
+        """
+        with open(filename, 'rb') as file:
+            digest = hashlib.sha256(file.read()).hexdigest()
+        directory, name = os.path.split(filename)
+        return os.path.join(directory, Network.cache_directory, f'{name}.{digest[:32]}.v{Network.version}.bnc')
+
+
+    @staticmethod
+    def remove_stale(filename, path):
+        """
+        Remove the compiled networks of the given .bif file other than the one
+        at the path, which belong to older contents of the file or older formats.
+        """
+        directory, current = os.path.split(path)
+        stale = re.compile(re.escape(os.path.basename(filename)) + r'\.[0-9a-f]{32}(\.v\d+)?\.bnc')
+        for entry in os.listdir(directory):
+            if entry != current and stale.fullmatch(entry):
+                try:
+                    os.remove(os.path.join(directory, entry))
+                except FileNotFoundError:
+                    pass  # removed by another process at the same time
+
+
+    @classmethod
+    def from_tables(cls, values, parents, tables):
+        """
+        Create a network from the domains, the parents and the probability
+        tables of the variables by name, given like the ones of InternalNetwork.
+        """
+        network = cls.__new__(cls)
+        network._build(values, parents, tables)
+        return network
 
-        # create variables with their name and domain
-        self.variables = sorted([Variable(name, domain) for name, domain in self._network.values.items()])
+
+    @classmethod
+    def load(cls, path):
+        """Load a network which was compiled with Network.save."""
+        network = cls.__new__(cls)
+        network._read(path)
+        return network
+
+
+    def save(self, path):
+        """
+        Compile the network to a binary file. The file starts with a header
+        describing the variables, their domains and parents and the location of
+        every factor, followed by an aligned block with all the values of the
+        factors. The file is written atomically so concurrent readers never
+        see a partially written network.
+        """
+        offset = 0
+        factors = []
+        for factor in self.factors:
+            factors.append({
+                'variables': [variable.name for variable in factor.variables],
+                'offset': offset,
+            })
+            offset += factor.table.size
+
+        header = json.dumps({
+            'variables': [{
+                'name': variable.name,
+                'domain': variable.domain,
+                'parents': [parent.name for parent in variable.parents],
+            } for variable in self.variables],
+            'factors': factors,
+            'size': offset,
+        }).encode()
+
+        # align the values to a page, so they can be mapped without copying
+        start = len(Network.magic) + 8 + len(header)
+        padding = -start % mmap.ALLOCATIONGRANULARITY
+
+        os.makedirs(os.path.dirname(path) or '.', exist_ok = True)
+        temporary = f'{path}.{os.getpid()}.tmp'
+        with open(temporary, 'wb') as file:
+            file.write(Network.magic)
+            file.write(struct.pack('<Q', len(header)))
+            file.write(header)
+            file.write(b'\x00' * padding)
+            for factor in self.factors:
+                file.write(factor.table.astype('<f8').tobytes())
+        os.replace(temporary, path)
+
+
+    def _read(self, path):
+        """
+        Read a compiled network. The values of the factors are memory mapped,
+        so processes loading the same file share the pages.
+        """
+        with open(path, 'rb') as file:
+            if file.read(len(Network.magic)) != Network.magic:
+                raise ValueError(f'{path} is not a compiled network')
+            length, = struct.unpack('<Q', file.read(8))
+            header = json.loads(file.read(length))
+
+        start = len(Network.magic) + 8 + length
+        start += -start % mmap.ALLOCATIONGRANULARITY
+        values = np.memmap(path, dtype = '<f8', mode = 'r', offset = start, shape = (header['size'],)) \
+            if header['size'] > 0 else np.zeros(0)
+
+        # create variables with their name and domain and link them together
+        self._link(
+            {variable['name']: variable['domain'] for variable in header['variables']},
+            {variable['name']: variable['parents'] for variable in header['variables']})
+
+        # create all the factors as views on the mapped values
+        self.factors = []
+        for factor in header['factors']:
+            variables = [self.variable_names[name] for name in factor['variables']]
+            size = math.prod(len(variable.domain) for variable in variables)
+            self.factors.append(Factor(variables, values[factor['offset']:factor['offset'] + size]))
+
+
+    def _build(self, values, parents, tables):
+        """Create the variables and the factors of the probability tables."""
+
+        # create variables with their name and domain and link them together
+        self._link(values, parents)
+
+        # create all the factors from the conditional probability tables
+        self.factors = [self._cpt_factor(variable, values[variable.name],
+            parents[variable.name], tables[variable.name]) for variable in self.variables]
+
+
+    def _link(self, domains, parents):
+        """
+        Create the variables with their name and domain and link them to their
+        parents and children, which are given by name. Every variable gets its
+        index in the sorted variables as id, which is also the index of its
+        factor, and the parents and children are indexed by id as well.
+        """
+        self.variables = sorted([Variable(name, domain) for name, domain in domains.items()])
         self.variable_names = {variable.name : variable for variable in self.variables}
+        self.ids = {variable.name: index for index, variable in enumerate(self.variables)}
 
-        # compute the parents and link variables together accordingly
-        for variable in self.variables:
-            variable.parents = sorted(
-                    possible_parent for possible_parent in self.variables
-                    if possible_parent.name in self._network.parents[variable.name]
-            )
+        # the barren and irrelevant variables per query and evidence variables
+        self.relevance = {}
 
-        # compute the children and link variables together accordingly
+        for index, variable in enumerate(self.variables):
+            variable.id = index
+            variable.children = []
+
+        # link the variables to their parents and children, the variables are
+        # visited in sorted order so the children are sorted as well
         for variable in self.variables:
-            variable.children = sorted(
-                possible_child for possible_child in self.variables
-                if variable in possible_child.parents
-            )
+            variable.parents = sorted(self.variable_names[name] for name in set(parents[variable.name]))
+            for parent in variable.parents:
+                parent.children.append(variable)
 
-        # make sure that the columns and the rows are sorted
-        for key in self._network.probs.keys():
-            self._network.probs[key].sort_index(axis = 1, inplace = True)
-            self._network.probs[key].sort_values(by = list(self._network.probs[key].columns), inplace = True)
+        self.parent_ids = [[parent.id for parent in variable.parents] for variable in self.variables]
+        self.child_ids = [[child.id for child in variable.children] for variable in self.variables]
 
-        # create all the factors
-        self.factors = []
-        for key in sorted(self._network.probs.keys()):
-            variable_names = list(self._network.probs[key].columns[:-1])  # header without 'probs'
-            variables = list(map(self.name_to_variable, variable_names))  # actual variables
-            values = list(self._network.probs[key][self._network.probs[key].columns[-1]])  # last column
-            self.factors.append(Factor(variables, values))
+
+    def _cpt_factor(self, variable, values, parents, rows):
+        """
+        Create the factor for the conditional probability table of the variable,
+        given by its values, the names of its parents and the rows of its table.
+        The flat index of every entry follows from the indices of the values of
+        the variable and its parents, so the values are written directly into a
+        preallocated table.
+        """
+        variables = sorted([variable] + variable.parents)
+        shape = [len(other.domain) for other in variables]
+
+        # the offset in the flat table of every value of every variable
+        offsets = {}
+        for i, other in enumerate(variables):
+            stride = math.prod(shape[i + 1:])
+            offsets[other] = {value: stride * index for index, value in enumerate(other.domain)}
+
+        # the parents and values are listed in the order of the .bif file
+        parents = [self.variable_names[name] for name in parents]
+        columns = np.array([offsets[variable][value] for value in values])
+
+        table = np.full(math.prod(shape), np.nan)
+        for parent_values, probs in rows:
+            row = sum(offsets[parent][value] for parent, value in zip(parents, parent_values))
+            table[row + columns] = probs
+        assert not np.isnan(table).any(), f'incomplete probability table for {variable}'
+
+        return Factor(variables, table)
 
 
     def variable_to_factor(self, variable):
         """Get the factor corresponding to the given variable."""
-        assert variable in self.variables
-        return self.factors[self.variables.index(variable)]
+        assert variable.name in self.ids
+        return self.factors[self.ids[variable.name]]
 
 
     def name_to_factor(self, name):
         """Get the factor corresponding to the given variable name."""
-        assert name in map(lambda variable: variable.name, self.variables)
-        return self.factors[self.variables.index(self.variable_names[name])]
+        assert name in self.ids
+        return self.factors[self.ids[name]]
 
 
     def name_to_variable(self, name):
         """Get the variable corresponding to the given variable name."""
-        assert name in map(lambda variable: variable.name, self.variables)
+        assert name in self.variable_names
         return self.variable_names[name]
 
 
@@ -71,115 +266,181 @@ class InternalNetwork:
 
     I made changes so that there is no global class state and I removed the
     SEVEN memory leaks from not closed file descriptors.....
+
+    The file is now tokenized and parsed in a single pass, so blocks may be
+    spread over any number of lines and the file is only opened once.
     """
 
+    # a token is a comment start, a single punctuation character or a run of other characters
+    token = re.compile(r'//|/\*|[{}()\[\]|,;]|[^\s{}()\[\]|,;]+')
+
 
     def __init__(self, filename):
         """
         Construct a bayesian network from a .bif file
         """
 
+        self.name = None
+
         # Possible values per variable
         self.values = {}
 
         # Parents per variable
         self.parents = {}
 
-        # Probability distributions per variable
-        self.probs = {}
+        # Conditional probability tables per variable, as a list of rows with
+        # the values of the parents and the probabilities for each value
+        self.tables = {}
 
         with open(filename, 'r') as file:
-            line_number = 0
-            for line in file:
-                if line.startswith('network'):
-                    self.name = ' '.join(line.split()[1:-1])
-                elif line.startswith('variable'):
-                    self.parse_variable(line_number, filename)
-                elif line.startswith('probability'):
-                    self.parse_probability(line_number, filename)
-                line_number = line_number + 1
+            self.tokens = self.tokenize(file)
+            for keyword in self.tokens:
+                if keyword == 'network':
+                    self.parse_network()
+                elif keyword == 'variable':
+                    self.parse_variable()
+                elif keyword == 'probability':
+                    self.parse_probability()
+                else:
+                    raise ValueError(f'unexpected token {keyword!r} in {filename}')
+            del self.tokens
+
+
+    def tokenize(self, file):
+        """
+        Lazily split the lines of the file into tokens, skipping comments.
+        """
+        comment = False
+        for line in file:
+            position = 0
+            while True:
+                if comment:
+                    end = line.find('*/', position)
+                    if end < 0:
+                        break
+                    comment, position = False, end + 2
+
+                match = self.token.search(line, position)
+                if match is None or match.group().startswith('//'):
+                    break
+                position = match.end()
+
+                if match.group() == '/*':
+                    comment = True
+                else:
+                    yield match.group()
 
 
-    def parse_probability(self, line_number, filename):
+    def next(self, expected = None):
         """
-        Parse the probability distribution
+        Get the next token, checking that it is the expected one if given.
         """
+        token = next(self.tokens, None)
+        if token is None:
+            raise ValueError('unexpected end of file')
+        if expected is not None and token != expected:
+            raise ValueError(f'expected {expected!r} but got {token!r}')
+        return token
 
-        lines = None
-        with open(filename, 'r') as file:
-            lines = file.readlines()
 
-        # get line
-        line = lines[line_number]
+    def parse_list(self, end):
+        """
+        Parse a comma separated list of tokens up to and including the end token.
+        """
+        items = []
+        token = self.next()
+        while token != end:
+            if token != ',':
+                items.append(token)
+            token = self.next()
+        return items
 
-        # Find out what variable(s) we are talking about
-        variable, parents = self.parse_parents(line)
-        next_line = lines[line_number + 1].strip()
-
-        # If a variable has no parents, its probabilities start with table
-        if next_line.startswith('table'):
-            comma_sep_probs = next_line.split('table')[1].split(';')[0].strip()
-            probs = [float(p) for p in comma_sep_probs.split(',')]
-            df = pd.DataFrame(columns=[variable, 'prob'])
-            for value, p in zip(self.values[variable], probs):
-                df.loc[len(df)] = [value, p]
-                self.probs[variable] = df
-        else:
-            #create dataFrame to store the variables
-            df = pd.DataFrame(columns=[variable] + parents + ['prob'])
-
-            #loop over the lines until a line is the same as "}"
-            with open(filename, 'r') as file:
-                for i in range(line_number + 1):
-                    file.readline()
-                for line in file:
-                    if '}' in line:
-                        # Done reading this probability distribution
-                        break
 
-                    # Get the values for the parents
-                    comma_sep_values = line.split('(')[1].split(')')[0]
-                    values = [v.strip() for v in comma_sep_values.split(',')]
+    def skip_statement(self, token):
+        """
+        Skip the statement starting with the given token, up to the next ';'.
+        """
+        while token != ';':
+            token = self.next()
 
-                    # Get the probabilities for the variable
-                    comma_sep_probs = line.split(')')[1].split(';')[0].strip()
-                    probs = [float(p) for p in comma_sep_probs.split(',')]
 
-                    # Create a row in the df for each value combination
-                    for value, p in zip(self.values[variable], probs):
-                        df.loc[len(df)] = [value] + values + [p]
+    def parse_network(self):
+        """
+        Parse the name of the network, its properties are ignored
+        """
+        name = []
+        token = self.next()
+        while token != '{':
+            name.append(token)
+            token = self.next()
+        self.name = ' '.join(name)
 
-            self.probs[variable] = df
+        token = self.next()
+        while token != '}':
+            self.skip_statement(token)
+            token = self.next()
 
 
-    def parse_variable(self, line_number, filename):
+    def parse_variable(self):
         """
         Parse the name of a variable and its possible values
         """
-        lines = None
-        with open(filename, 'r') as file:
-            lines = file.readlines()
-
-        variable = lines[line_number].split()[1]
-        line = lines[line_number+1]
-        start = line.find('{') + 1
-        end = line.find('}')
-        values = [value.strip() for value in line[start:end].split(',')]
-        self.values[variable] = values
-
-
-    def parse_parents(self, line):
-        """
-        Find out what variables are the parents
-        Returns the variable and its parents
-        """
-        start = line.find('(') + 1
-        end = line.find(')')
-        variables = line[start:end].strip().split('|')
-        variable = variables[0].strip()
-        if len(variables) > 1:
-            parents = variables[1]
-            self.parents[variable] = [v.strip() for v in parents.split(',')]
-        else:
-            self.parents[variable] = []
-        return variable, self.parents[variable]
+        variable = self.next()
+        self.next('{')
+
+        token = self.next()
+        while token != '}':
+            if token == 'type':
+                self.next('discrete')
+                self.next('[')
+                size = int(self.next())
+                self.next(']')
+                self.next('{')
+                self.values[variable] = self.parse_list('}')
+                self.next(';')
+                assert len(self.values[variable]) == size
+            else:
+                self.skip_statement(token)
+            token = self.next()
+
+
+    def parse_probability(self):
+        """
+        Parse the probability distribution
+        """
+
+        # Find out what variable(s) we are talking about
+        self.next('(')
+        variable = self.next()
+        token = self.next()
+        if token not in ('|', ')'):
+            raise ValueError(f'expected \'|\' or \')\' but got {token!r}')
+        self.parents[variable] = self.parse_list(')') if token == '|' else []
+        self.next('{')
+
+        parents = self.parents[variable]
+        size = len(self.values[variable])
+        rows = []
+
+        token = self.next()
+        while token != '}':
+            if token == 'table':
+                # a table lists the probabilities of the variable for every
+                # combination of values of the parents, the last parent changing fastest
+                probs = [float(p) for p in self.parse_list(';')]
+                combinations = list(itertools.product(*(self.values[p] for p in parents)))
+                for index, values in enumerate(combinations):
+                    rows.append((list(values), probs[index::len(combinations)]))
+            elif token == '(':
+                # Get the values for the parents and the probabilities for the variable
+                values = self.parse_list(')')
+                probs = [float(p) for p in self.parse_list(';')]
+                rows.append((values, probs))
+            elif token == 'default':
+                raise ValueError(f'default entries are not supported ({variable})')
+            else:
+                self.skip_statement(token)
+            token = self.next()
+
+        assert all(len(values) == len(parents) and len(probs) == size for values, probs in rows)
+        self.tables[variable] = rows
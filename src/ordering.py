@@ -0,0 +1,165 @@
+import math
+
+
+class IndexedPriorityQueue:
+    """
+    A binary min-heap of keys in which the priority of a key that is already
+    in the queue can be changed in logarithmic time. The position of every key
+    in the heap is tracked in a dictionary to make this possible.
+    """
+
+    def __init__(self):
+        self.heap = []  # list with pairs (priority, key)
+        self.position = {}  # key to index in the heap
+
+
+    def __len__(self):
+        return len(self.heap)
+
+
+    def __contains__(self, key):
+        return key in self.position
+
+
+    def push(self, key, priority):
+        """Insert the key, or change its priority if it is already present."""
+        if key in self.position:
+            index = self.position[key]
+            old = self.heap[index][0]
+            self.heap[index] = (priority, key)
+            if priority < old:
+                self._sift_up(index)
+            else:
+                self._sift_down(index)
+        else:
+            self.heap.append((priority, key))
+            self.position[key] = len(self.heap) - 1
+            self._sift_up(len(self.heap) - 1)
+
+
+    def pop(self):
+        """Remove and return the key with the lowest priority."""
+        self._swap(0, len(self.heap) - 1)
+        _, key = self.heap.pop()
+        del self.position[key]
+        if len(self.heap) > 0:
+            self._sift_down(0)
+        return key
+
+
+    def _swap(self, i, j):
+        self.heap[i], self.heap[j] = self.heap[j], self.heap[i]
+        self.position[self.heap[i][1]] = i
+        self.position[self.heap[j][1]] = j
+
+
+    def _sift_up(self, index):
+        while index > 0:
+            parent = (index - 1) // 2
+            if self.heap[index] >= self.heap[parent]:
+                break
+            self._swap(index, parent)
+            index = parent
+
+
+    def _sift_down(self, index):
+        while True:
+            smallest = index
+            for child in (2 * index + 1, 2 * index + 2):
+                if child < len(self.heap) and self.heap[child] < self.heap[smallest]:
+                    smallest = child
+            if smallest == index:
+                break
+            self._swap(index, smallest)
+            index = smallest
+
+
+def interaction_graph(variables, evidence, barren):
+    """
+    Construct the moralized interaction graph of the nonbarren variables which
+    are not observed. Every variable is connected to all the other variables
+    in the (reduced) factor of itself and its parents.
+    """
+    barren = set(barren)
+    graph = {variable: set() for variable in variables
+        if variable not in barren and variable.name not in evidence}
+
+    # connect all the variables in the scope of every reduced factor
+    for variable in variables:
+        if variable not in barren:
+            scope = [other for other in [variable] + variable.parents if other in graph]
+            for other in scope:
+                graph[other].update(scope)
+
+    for variable, neighbours in graph.items():
+        neighbours.discard(variable)
+    return graph
+
+
+def _fill_edges(graph, variable):
+    """All the pairs of neighbours of the variable which are not connected yet."""
+    neighbours = sorted(graph[variable])
+    return [(a, b) for i, a in enumerate(neighbours) for b in neighbours[i + 1:]
+        if b not in graph[a]]
+
+
+def min_degree(graph, variable):
+    return len(graph[variable])
+
+
+def min_fill(graph, variable):
+    return len(_fill_edges(graph, variable))
+
+
+def min_weight(graph, variable):
+    return math.prod(len(other.domain) for other in graph[variable] | {variable})
+
+
+def weighted_min_fill(graph, variable):
+    return sum(len(a.domain) * len(b.domain) for a, b in _fill_edges(graph, variable))
+
+
+heuristics = {
+    'min-degree': min_degree,
+    'min-fill': min_fill,
+    'min-weight': min_weight,
+    'weighted-min-fill': weighted_min_fill,
+}
+
+
+def greedy_order(graph, marginalize, heuristic):
+    """
+    Compute an elimination order for the variables to marginalize by greedily
+    eliminating the variable with the lowest cost in the interaction graph.
+    Ties are broken on the name of the variable so the order is deterministic.
+    """
+    cost = heuristics[heuristic]
+    fill = heuristic in ('min-fill', 'weighted-min-fill')
+    graph = {variable: set(neighbours) for variable, neighbours in graph.items()}
+
+    queue = IndexedPriorityQueue()
+    for variable in marginalize:
+        queue.push(variable, (cost(graph, variable), variable))
+
+    order = []
+    while len(queue) > 0:
+        variable = queue.pop()
+        order.append(variable)
+
+        # connect the neighbours of the variable and remove the variable
+        neighbours = graph.pop(variable)
+        for other in neighbours:
+            graph[other].discard(variable)
+            graph[other].update(neighbours - {other})
+
+        # only the costs in the neighbourhood of the variable can change, for the
+        # fill heuristics this neighbourhood extends to the second neighbours
+        affected = set(neighbours)
+        if fill:
+            for other in neighbours:
+                affected.update(graph[other])
+        for other in affected:
+            if other in queue:
+                queue.push(other, (cost(graph, other), other))
+
+    return order
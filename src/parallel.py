@@ -0,0 +1,81 @@
+from factor import Factor
+from network import Network
+import algorithm
+import util
+
+import multiprocessing
+
+
+# the network and settings of a worker process, set by the initializer
+_network = None
+_order = None
+_log = False
+
+
+def _initialize(network, order, log):
+    """
+    Prepare a worker process. The network is inherited from the parent by
+    forking, so the tables are shared instead of copied. A worker never writes
+    the text trace, whatever the sink of the parent is.
+    """
+    global _network, _order, _log
+    _network, _order, _log = network, order, log
+    util.sink = None
+    util.verbosity = 0
+
+
+def _answer(job):
+    """
+    Answer a single query in a worker. The factor is returned by the names of
+    its variables and its table, the parent creates the factor again, so the
+    ids of the factors of the worker never reach the parent.
+    """
+    query, evidence = job
+    factor = algorithm.ve(_network, query, evidence, _order, _log)
+    return ([variable.name for variable in factor.variables],
+        [variable.name for variable in factor.reduced], factor.table)
+
+
+class ParallelInference:
+    """
+    Answer independent queries with variable elimination in a pool of worker
+    processes. The network is loaded once, from the compiled network when the
+    cache is used, before the workers are forked, so all the processes share
+    the memory of the probability tables. Every worker keeps its own factor
+    cache and its own util and Factor.uid state.
+    """
+
+    def __init__(self, network, processes = None, chunksize = 16, order = None, log = False):
+        self.network = Network(network) if type(network) is str else network
+        self.chunksize = chunksize
+
+        # forking is required to share the loaded network with the workers
+        context = multiprocessing.get_context('fork')
+        self.pool = context.Pool(processes, _initialize, (self.network, order, log))
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exception):
+        self.close()
+
+
+    def close(self):
+        self.pool.terminate()
+        self.pool.join()
+
+
+    def map(self, jobs):
+        """
+        Answer the jobs, pairs of query variables and evidence, in chunks of
+        chunksize jobs per worker. The posterior factors are returned in the
+        order of the jobs.
+        """
+        factors = []
+        for names, reduced, table in self.pool.imap(_answer, jobs, self.chunksize):
+            variables = [self.network.name_to_variable(name) for name in names]
+            reduced = [self.network.name_to_variable(name) for name in reduced]
+            factors.append(Factor(variables, table, reduced))
+        return factors
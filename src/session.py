@@ -0,0 +1,61 @@
+from junction import JunctionTree
+import util
+
+
+class Session:
+    """
+    An interactive inference session on a network, in which evidence is added
+    and retracted one variable at a time. The session keeps the messages of a
+    junction tree: a change of evidence only removes the messages directed away
+    from the clique of the observed variable, and a query only computes the
+    missing messages towards the clique of the queried variable. The marginals
+    are cached until the evidence changes.
+    """
+
+    def __init__(self, network, order = 'min-fill'):
+        self.network = network
+        self.tree = JunctionTree(network, order)
+        self.evidence = {}  # dictionary from variable names to values
+        self.cache = {}  # dictionary from variable names to marginals
+
+
+    def observe(self, name, value):
+        """Observe the given value for the variable, replacing earlier evidence."""
+        if self.evidence.get(name) == value:
+            return
+
+        variable = self.network.name_to_variable(name)
+        self.tree.evidence[variable] = self.tree.indicator(variable, value)
+        self.evidence[name] = value
+        self._update(variable)
+
+
+    def retract(self, name):
+        """Retract the evidence for the variable, if any."""
+        if name not in self.evidence:
+            return
+
+        variable = self.network.name_to_variable(name)
+        del self.tree.evidence[variable]
+        del self.evidence[name]
+        self._update(variable)
+
+
+    def _update(self, variable):
+        if util.sink is not None:
+            util.sink('evidence', evidence = self.evidence)
+        self.tree.invalidate(self.tree.owner[variable])
+        self.cache = {}
+
+
+    def marginal(self, name):
+        """The posterior distribution of the variable given the current evidence."""
+        if name not in self.cache:
+            self.tree.collect(self.tree.owner[self.network.name_to_variable(name)])
+            self.cache[name] = self.tree.marginal(name)
+        return self.cache[name]
+
+
+    def marginals(self):
+        """The posterior distributions of all the variables by name."""
+        return {variable.name: self.marginal(variable.name) for variable in self.network.variables}
@@ -0,0 +1,104 @@
+import util
+
+import json
+import math
+
+
+class Trace:
+    """
+    A sink recording every multiplication of an inference run as a step: the
+    eliminated variable, or None for the final product, the scopes and table
+    sizes of the input factors, the size of their product, the scope and size
+    of the resulting factor and the seconds spent multiplying and summing or
+    maximizing out the variable. When the last product of a step is fused with
+    the marginalization, the fused product counts as marginalization. A step
+    whose result is reused from the cache has no inputs and no timings.
+
+    The trace attaches itself as the sink within a with statement, all the
+    events can be passed on to another sink, such as a util.TextSink.
+    """
+
+    def __init__(self, sink = None):
+        self.sink = sink
+        self.steps = []
+        self.variable = None
+
+
+    def __enter__(self):
+        self.previous = util.sink
+        util.sink = self
+        return self
+
+
+    def __exit__(self, *exception):
+        util.sink = self.previous
+
+
+    def __call__(self, event, **fields):
+        handler = getattr(self, '_' + event, None)
+        if handler is not None:
+            handler(**fields)
+        if self.sink is not None:
+            self.sink(event, **fields)
+
+
+    @staticmethod
+    def scope(factor):
+        return {'factor': factor.id, 'scope': [variable.name for variable in factor.variables],
+            'size': factor.table.size}
+
+
+    def _step(self, variable):
+        self.variable = variable
+
+
+    def _factors(self, factors):
+        # the step is done, a later product without a step is a final product
+        self.variable = None
+
+
+    def _multiply(self, factors, variable = None):
+        variables = set().union(*(factor.variables for factor in factors))
+        self.steps.append({
+            'variable': self.variable.name if self.variable is not None else None,
+            'inputs': [Trace.scope(factor) for factor in factors],
+            'product_size': math.prod(len(variable.domain) for variable in variables),
+            'output': None,
+            'product_time': 0.0,
+            'marginalize_time': 0.0,
+            'reused': False})
+
+
+    def _reuse(self, variable, factor):
+        self.steps.append({
+            'variable': variable.name,
+            'inputs': [],
+            'product_size': 0,
+            'output': Trace.scope(factor),
+            'product_time': 0.0,
+            'marginalize_time': 0.0,
+            'reused': True})
+
+
+    def _timing(self, product = 0.0, marginalize = 0.0):
+        self.steps[-1]['product_time'] += product
+        self.steps[-1]['marginalize_time'] += marginalize
+
+
+    def _product(self, factor):
+        self.steps[-1]['output'] = Trace.scope(factor)
+
+
+    def _maximize(self, variable, factor):
+        self.steps[-1]['output'] = Trace.scope(factor)
+
+
+    def largest(self):
+        """The step with the largest product, where the elimination blows up."""
+        return max(self.steps, key = lambda step: step['product_size'])
+
+
+    def write(self, file):
+        """Write the steps to the file as JSON lines."""
+        for step in self.steps:
+            file.write(json.dumps(step) + '\n')
@@ -1,9 +1,15 @@
 import sys
+import types
 
 
 verbosity = 1
 file = sys.stdout
 
+# the sink receiving the events of the algorithms, None when nothing listens.
+# A call site guards every event with a check on None, so without a sink no
+# event is built and no text is formatted.
+sink = None
+
 
 def print_header(text):
     if verbosity > 0:
@@ -54,3 +60,154 @@ def print_groups(query, evidence, barren):
 
 def show_evidence(evidence):
     return ', '.join(map(lambda e: f'{e[0]} = {e[1]}', evidence.items()))
+
+
+class TextSink:
+    """
+    The sink writing the events as the text trace, at the verbosity and to the
+    file of this module. Every event is handled by the method of the same name.
+    """
+
+    def __call__(self, event, **fields):
+        getattr(self, event)(**fields)
+
+
+    def setup(self, algorithm, query, evidence, barren):
+        print_header(f'Running {algorithm} on the following setup')
+        print_groups(query, evidence, barren)
+
+
+    def irrelevant(self, variables):
+        if len(variables) > 0:
+            print_simple(f'Irrelevant: {", ".join(map(str, variables))}\n')
+
+
+    def order(self, method, order):
+        print_header('Elimination order')
+        if method is None:
+            print_simple('No elimination order instructions are given')
+            print_simple('An arbitrary elimination order is chosen')
+        elif type(method) is list:
+            print_simple('An elimination order was provided')
+        else:
+            print_simple(f'The elimination order is computed using {method}')
+        print_simple(f'\nOrder: {order}\n')
+
+
+    def reduced(self, evidence, factors):
+        print_header(
+            'Reduced factors of nonbarren nodes based on evidence\n'
+            'Evidence: {}'.format(show_evidence(evidence)))
+        print_factors_brief(factors)
+
+
+    def reduced_batch(self, rows, factors):
+        print_header(f'Reduced factors of nonbarren nodes for {rows} evidence rows')
+        print_factors_brief(factors)
+
+
+    def log_domain(self):
+        print_simple('Converted the factors to the log domain\n')
+
+
+    def loop(self, title, order, factors = None):
+        print_header(f'{title}\nOrder: {order}')
+        if factors is not None:
+            print_factors_brief(factors)
+
+
+    def header(self, title):
+        print_header(title)
+
+
+    def step(self, variable):
+        print_header(f'Processing variable {variable}')
+
+
+    def reuse(self, variable, factor):
+        print_simple(f'Reusing the marginalized factor:\n')
+        print_factor_brief(factor)
+
+
+    def multiply(self, factors, variable = None):
+        if variable is None:
+            print_simple('Multiplying the following factors:\n')
+        else:
+            print_simple(f'Multiplying the following factors and marginalizing over {variable}:\n')
+        print_factors_brief(factors)
+
+
+    def flops(self, predicted, actual):
+        print_simple(f'Predicted flops: {predicted}, actual flops: {actual}\n')
+
+
+    def timing(self, product = 0.0, marginalize = 0.0):
+        # the timings are only recorded by a trace, the text stays reproducible
+        pass
+
+
+    def product(self, factor):
+        print_simple(f'Resulting in:\n')
+        print_factor_brief(factor)
+
+
+    def marginalize(self, variable, factor):
+        print_simple(f'Marginalizing over {variable} gives:\n')
+        print_factor_brief(factor)
+
+
+    def maximize(self, variable, factor):
+        print_simple(f'Maximizing over {variable} gives:\n')
+        print_factor_brief(factor)
+
+
+    def factors(self, factors):
+        print_simple('The new factors are:\n')
+        print_factors_brief(factors)
+
+
+    def result(self, factor):
+        print_header(f'Normalization and final factor')
+        print_factor(factor)
+
+
+    def assignment(self, title, assignment, probability):
+        print_header(title)
+        print_simple(f'{show_evidence(assignment)}\nProbability: {probability}\n')
+
+
+    def junction_tree(self, cliques, neighbours):
+        print_header('Junction tree')
+        for clique, others in zip(cliques, neighbours):
+            print_simple(f'{sorted(clique)} -> {sorted(others)}')
+        print_simple('')
+
+
+    def calibrate(self, evidence):
+        print_header(f'Calibrating the junction tree\nEvidence: {show_evidence(evidence)}')
+
+
+    def evidence(self, evidence):
+        print_header(f'Evidence changed\nEvidence: {show_evidence(evidence)}')
+
+
+class _Module(types.ModuleType):
+    """
+    Setting the verbosity attaches the text sink, or detaches it at verbosity 0.
+    Another sink which is attached is left alone.
+    """
+
+    @property
+    def verbosity(self):
+        return self.__dict__['verbosity']
+
+
+    @verbosity.setter
+    def verbosity(self, value):
+        self.__dict__['verbosity'] = value
+        if self.sink is None or type(self.sink) is TextSink:
+            self.sink = TextSink() if value > 0 else None
+
+
+sys.modules[__name__].__class__ = _Module
+sys.modules[__name__].verbosity = verbosity
@@ -9,6 +9,7 @@ class Variable:
         self.domain = sorted(domain)
         self.parents = None
         self.children = None
+        self.id = None  # the index of the variable in its network
 
 
     def __lt__(self, other):
@@ -1,11 +1,21 @@
 import unittest
 import sys
 sys.path.extend(["src", "oracle"])
+import io
 import itertools
+import math
+import os
+import tempfile
+import threading
 
 import util
+import algorithm
+import generate
 from network import Network
-from algorithm import ve, init_barren
+from factor import Factor
+from variable import Variable
+from algorithm import (ve, ve_batch, ve_evidence_batch, init_barren, FactorCache,
+    plan_greedy, plan_optimal, elimination_tree)
 
 # oracle imports
 from probVE import VE
@@ -13,6 +23,22 @@ from probGraphicalModels import (Alarm, Fire, Leaving, Report, Smoke, Tampering,
      Graphical_model, bn_fire_alarm, Inference_method)
 
 
+def joints(network, evidence):
+    """The joint probability of every complete assignment consistent with the evidence."""
+    names = [variable.name for variable in network.variables]
+    joints = []
+    for values in itertools.product(*[variable.domain for variable in network.variables]):
+        assignment = dict(zip(names, values))
+        if any(assignment[name] != value for name, value in evidence.items()):
+            continue
+        probability = 1
+        for factor in network.factors:
+            probability *= factor.table[tuple(variable.domain.index(assignment[variable.name])
+                for variable in factor.variables)]
+        joints.append((assignment, probability))
+    return joints
+
+
 class TestVEAlarm(unittest.TestCase):
 
 
@@ -79,6 +105,647 @@ class TestVEAlarm(unittest.TestCase):
         util.verbosity = 1
 
 
+class TestVEBatch(unittest.TestCase):
+
+
+    def setUp(self):
+        util.verbosity = 0
+
+
+    def tearDown(self):
+        util.verbosity = 1
+
+
+    def _test_network(self, filename, order = None):
+        network = Network(filename)
+        names = [variable.name for variable in network.variables]
+
+        queries = []
+        for query in names:
+            for observed in itertools.combinations([name for name in names if name != query], 2):
+                domains = [network.name_to_variable(name).domain for name in observed]
+                for values in itertools.product(*domains):
+                    queries.append(([query], dict(zip(observed, values))))
+
+        factors = ve_batch(network, queries, order)
+        self.assertEqual(len(factors), len(queries))
+        for (query, evidence), factor in zip(queries, factors):
+            expected = ve(network, query, evidence)
+            self.assertEqual(factor.variables, expected.variables)
+            for value1, value2 in zip(factor.values, expected.values):
+                self.assertAlmostEqual(value1, value2, 12)
+
+
+    def test_alarm(self):
+        self._test_network('data/alarm.bif')
+
+
+    def test_survey(self):
+        self._test_network('data/survey.bif', 'min-fill')
+
+
+    def test_mixed(self):
+        network = Network('data/alarm.bif')
+        queries = [
+            (['Leaving', 'Smoke'], {'Alarm': 'False'}),
+            (['Fire'], {}),
+            (['Smoke', 'Leaving'], {'Alarm': 'True'}),
+        ]
+
+        factors = ve_batch(network, queries)
+        for (query, evidence), factor in zip(queries, factors):
+            self.assertEqual(factor.values, ve(network, query, evidence).values)
+
+
+class TestVEEvidenceBatch(unittest.TestCase):
+
+
+    def setUp(self):
+        util.verbosity = 0
+
+
+    def tearDown(self):
+        util.verbosity = 1
+
+
+    def _test_network(self, filename, query, observed, order = None):
+        network = Network(filename)
+        domains = [network.name_to_variable(name).domain for name in observed]
+        evidence = [dict(zip(observed, values)) for values in itertools.product(*domains)]
+
+        table = ve_evidence_batch(network, query, evidence, order)
+        self.assertEqual(table.shape[0], len(evidence))
+        for row, values in zip(evidence, table):
+            expected = ve(network, query, row)
+            self.assertEqual(len(values), len(expected.values))
+            for value1, value2 in zip(values, expected.values):
+                self.assertAlmostEqual(value1, value2, 12)
+
+
+    def test_alarm(self):
+        self._test_network('data/alarm.bif', ['Fire'], ['Leaving', 'Smoke'])
+
+
+    def test_alarm_related(self):
+        # both evidence variables end up in the same factors
+        self._test_network('data/alarm.bif', ['Leaving', 'Smoke'], ['Alarm', 'Tampering', 'Fire'])
+
+
+    def test_survey(self):
+        self._test_network('data/survey.bif', ['T', 'S'], ['A', 'R'], 'min-fill')
+
+
+    def test_unrelated(self):
+        # the evidence is barren for the query, so every row is the same
+        self._test_network('data/earthquake.bif', ['Burglary'], ['Earthquake'])
+
+
+class TestFactorCache(unittest.TestCase):
+
+
+    def setUp(self):
+        self.network = Network('data/alarm.bif')
+        self.cache = algorithm.cache
+        algorithm.cache = FactorCache(2 ** 20)
+        util.verbosity = 0
+
+
+    def tearDown(self):
+        algorithm.cache = self.cache
+        util.verbosity = 1
+
+
+    def test_repeat(self):
+        factor1 = ve(self.network, ['Leaving'], {'Alarm': 'False'})
+        self.assertEqual(algorithm.cache.hits, 0)
+        misses = algorithm.cache.misses
+
+        factor2 = ve(self.network, ['Leaving'], {'Alarm': 'False'})
+        self.assertEqual(algorithm.cache.hits, misses)
+        self.assertEqual(algorithm.cache.misses, misses)
+        self.assertEqual(factor1.values, factor2.values)
+
+
+    def test_disabled(self):
+        factor1 = ve(self.network, ['Smoke'], {'Report': 'True'})
+        algorithm.cache = None
+        factor2 = ve(self.network, ['Smoke'], {'Report': 'True'})
+        self.assertEqual(factor1.values, factor2.values)
+
+
+    def test_evict(self):
+        variable = Variable('A', map(str, range(4)))
+        cache = FactorCache(3 * 4 * 8)  # room for three factors of four values
+
+        for key in range(3):
+            cache[key] = Factor([variable], [key] * 4)
+        self.assertIsNotNone(cache.get(0))
+
+        cache[3] = Factor([variable], [3] * 4)
+        self.assertEqual(len(cache), 3)
+        self.assertEqual(cache.size, 3 * 4 * 8)
+        self.assertIsNone(cache.get(1))  # the least recently used
+        self.assertIsNotNone(cache.get(0))
+        self.assertEqual((cache.hits, cache.misses), (2, 1))
+
+
+    def test_too_large(self):
+        variable = Variable('A', map(str, range(4)))
+        cache = FactorCache(8)
+
+        cache[0] = Factor([variable], [0] * 4)
+        self.assertEqual(len(cache), 0)
+
+
+    def test_threads(self):
+        variable = Variable('A', map(str, range(4)))
+        cache = FactorCache(10 * 4 * 8)
+
+        def use(offset):
+            for key in range(1000):
+                cache[(offset, key % 20)] = Factor([variable], [key] * 4)
+                cache.get((offset, (key + 7) % 20))
+
+        threads = [threading.Thread(target = use, args = (offset,)) for offset in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(cache), 10)
+        self.assertEqual(cache.size, 10 * 4 * 8)
+        self.assertEqual(cache.hits + cache.misses, 4000)
+
+
+class TestVELog(unittest.TestCase):
+
+
+    def setUp(self):
+        util.verbosity = 0
+
+
+    def tearDown(self):
+        util.verbosity = 1
+
+
+    def test_alarm(self):
+        network = Network('data/alarm.bif')
+        for query, evidence in [(['Leaving'], {'Alarm': 'False'}), (['Fire', 'Smoke'], {'Report': 'True'})]:
+            expected = ve(network, query, evidence)
+            factor = ve(network, query, evidence, log = True)
+            self.assertFalse(factor.log)
+            for value1, value2 in zip(factor.values, expected.values):
+                self.assertAlmostEqual(value1, value2, 12)
+
+
+    def test_underflow(self):
+        # a root with many children, each observed with a small probability
+        size = 200
+        with tempfile.NamedTemporaryFile('w', suffix = '.bif', delete = False) as file:
+            file.write('network unknown {\n}\n')
+            for name in ['R'] + [f'C{i}' for i in range(size)]:
+                file.write(f'variable {name} {{\n  type discrete [ 2 ] {{ a, b }};\n}}\n')
+            file.write('probability ( R ) {\n  table 0.5, 0.5;\n}\n')
+            for i in range(size):
+                file.write(f'probability ( C{i} | R ) {{\n  (a) 0.001, 0.999;\n  (b) 0.001001, 0.998999;\n}}\n')
+        network = Network(file.name, cache = False)
+        os.remove(file.name)
+
+        evidence = {f'C{i}': 'a' for i in range(size)}
+        factor = ve(network, ['R'], evidence, log = True)
+
+        ratio = math.exp(size * math.log(1.001))
+        self.assertAlmostEqual(factor.values[0], 1 / (1 + ratio), 9)
+        self.assertAlmostEqual(factor.values[1], ratio / (1 + ratio), 9)
+
+
+class TestProductOrder(unittest.TestCase):
+
+
+    def setUp(self):
+        util.verbosity = 0
+        self.variables = {name: Variable(name, map(str, range(10))) for name in 'ABCD'}
+
+
+    def tearDown(self):
+        util.verbosity = 1
+        algorithm.product_order = 'optimal'
+
+
+    def _scopes(self, *names):
+        return [frozenset(self.variables[name] for name in scope) for scope in names]
+
+
+    def _leaves(self, plan):
+        return [plan] if type(plan) is int else self._leaves(plan[0]) + self._leaves(plan[1])
+
+
+    def test_chain(self):
+        scopes = self._scopes('AB', 'CD', 'BC')
+        for planner in [plan_greedy, plan_optimal]:
+            plan, cost = planner(scopes)
+            self.assertEqual(sorted(self._leaves(plan)), [0, 1, 2])
+            self.assertEqual(cost, 1000 + 10000)
+
+
+    def test_optimal(self):
+        scopes = self._scopes('A', 'AB', 'BC', 'CD', 'D', 'AD', 'B')
+        plan_g, cost_g = plan_greedy(scopes)
+        plan_o, cost_o = plan_optimal(scopes)
+        self.assertEqual(sorted(self._leaves(plan_o)), list(range(len(scopes))))
+        self.assertLessEqual(cost_o, cost_g)
+
+
+    def test_single(self):
+        self.assertEqual(plan_greedy(self._scopes('AB')), (0, 0))
+        self.assertEqual(plan_optimal(self._scopes('AB')), (0, 0))
+
+
+    def test_flops(self):
+        a, b, c = (self.variables[name] for name in 'ABC')
+        factor1 = Factor([a, b], range(1, 101))
+        factor2 = Factor([b, c], range(1, 101))
+        factor3 = Factor([c], range(1, 11))
+
+        # a single factor is only summed, with 9 additions for each of the 10 sums
+        algorithm.flops = {'predicted': 0, 'actual': 0}
+        algorithm.marginalize_bucket([factor1], a)
+        self.assertEqual(algorithm.flops, {'predicted': 90, 'actual': 90})
+
+        # the product over A, B and C is fused with summing out B, in the log
+        # domain the product is computed before it is summed
+        for factors in [[factor1, factor2], [factor1.to_log(), factor2.to_log()]]:
+            algorithm.flops = {'predicted': 0, 'actual': 0}
+            algorithm.marginalize_bucket(factors, b)
+            self.assertEqual(algorithm.flops, {'predicted': 1000 + 900, 'actual': 1000 + 900})
+
+        # the product over B and C is executed first
+        algorithm.flops = {'predicted': 0, 'actual': 0}
+        algorithm.marginalize_bucket([factor1, factor2, factor3], b)
+        self.assertEqual(algorithm.flops, {'predicted': 100 + 1000 + 900, 'actual': 100 + 1000 + 900})
+
+
+    def test_operations(self):
+        a, b, c = (self.variables[name] for name in 'ABC')
+        factors = [Factor([a], range(1, 11)), Factor([b], range(1, 11)), Factor([c], range(1, 11))]
+
+        # the fused product multiplies all three factors for every entry, the
+        # product in the log domain first multiplies the factors over A and B
+        fused = Factor.sum_product(factors, a)
+        self.assertEqual(fused.operations, 2 * 1000 + 900)
+        product = Factor.sum_product([factor.to_log() for factor in factors], a)
+        self.assertEqual(product.operations, 100 + 1000 + 900)
+
+
+    def test_ve(self):
+        network = Network('data/alarm.bif')
+        cache, algorithm.cache = algorithm.cache, None
+        try:
+            factors = []
+            for strategy, log in [('greedy', False), ('optimal', False), ('optimal', True)]:
+                algorithm.product_order = strategy
+                algorithm.flops = {'predicted': 0, 'actual': 0}
+                factors.append(ve(network, ['Leaving', 'Smoke'], {'Report': 'True'}, log = log))
+                self.assertEqual(algorithm.flops['predicted'], algorithm.flops['actual'])
+                self.assertGreater(algorithm.flops['actual'], 0)
+
+            for factor in factors[1:]:
+                for value1, value2 in zip(factors[0].values, factor.values):
+                    self.assertAlmostEqual(value1, value2, 12)
+        finally:
+            algorithm.cache = cache
+
+
+class TestMaximize(unittest.TestCase):
+
+
+    def setUp(self):
+        util.verbosity = 0
+
+
+    def tearDown(self):
+        util.verbosity = 1
+
+
+    def _test_mpe(self, filename, evidence):
+        network = Network(filename)
+        best, expected = max(joints(network, evidence), key = lambda joint: joint[1])
+
+        for order, log in [(None, False), ('min-fill', False), ('min-degree', True)]:
+            assignment, probability = algorithm.mpe(network, evidence, order, log)
+            self.assertEqual({**assignment, **evidence}, best)
+            self.assertAlmostEqual(probability, expected, 12)
+
+
+    def _test_map(self, filename, query, evidence):
+        network = Network(filename)
+        totals = {}
+        for assignment, probability in joints(network, evidence):
+            key = tuple(assignment[name] for name in query)
+            totals[key] = totals.get(key, 0) + probability
+        best = max(totals, key = totals.get)
+
+        for order, log in [(None, False), ('min-fill', True)]:
+            assignment, probability = algorithm.map(network, query, evidence, order, log)
+            self.assertEqual(assignment, dict(zip(query, best)))
+            self.assertAlmostEqual(probability, totals[best], 12)
+
+
+    def test_mpe_alarm(self):
+        self._test_mpe('data/alarm.bif', {})
+        self._test_mpe('data/alarm.bif', {'Report': 'True'})
+        self._test_mpe('data/alarm.bif', {'Report': 'True', 'Smoke': 'False'})
+
+
+    def test_mpe_survey(self):
+        self._test_mpe('data/survey.bif', {'T': 'train'})
+
+
+    def test_map_alarm(self):
+        self._test_map('data/alarm.bif', ['Fire', 'Tampering'], {'Report': 'True'})
+        self._test_map('data/alarm.bif', ['Alarm'], {'Leaving': 'True', 'Smoke': 'True'})
+
+        # an observed query variable keeps its value
+        self._test_map('data/alarm.bif', ['Alarm'], {'Alarm': 'True'})
+        self._test_map('data/alarm.bif', ['Alarm', 'Fire'], {'Alarm': 'True', 'Report': 'True'})
+
+
+    def test_map_survey(self):
+        self._test_map('data/survey.bif', ['A', 'S'], {'T': 'train'})
+
+
+    def test_maximize(self):
+        va = Variable("A", map(str, range(3)))
+        vb = Variable("B", map(str, range(2)))
+
+        factor = Factor([va, vb], [0.5, 0.8, 0.1, 0, 0.3, 0.9]).maximize(va)
+        self.assertEqual(factor.values, [0.5, 0.9])
+        self.assertEqual(factor.backpointer[0], va)
+        self.assertEqual(factor.backpointer[1].tolist(), [0, 2])
+
+
+class TestProbabilityOfEvidence(unittest.TestCase):
+
+
+    def _test_network(self, filename, size, order = None):
+        network = Network(filename)
+        names = [variable.name for variable in network.variables]
+
+        evidence = [{}]
+        for observed in itertools.combinations(names, size):
+            domains = [network.name_to_variable(name).domain for name in observed]
+            evidence += [dict(zip(observed, values)) for values in itertools.product(*domains)]
+
+        probabilities = algorithm.probability_of_evidence(network, evidence, order)
+        self.assertEqual(len(probabilities), len(evidence))
+        for row, probability in zip(evidence, probabilities):
+            expected = sum(probability for _, probability in joints(network, row))
+            self.assertAlmostEqual(probability, expected, 12)
+            self.assertAlmostEqual(algorithm.probability_of_evidence(network, row, order), expected, 12)
+
+
+    def test_alarm(self):
+        self._test_network('data/alarm.bif', 2)
+
+
+    def test_survey(self):
+        self._test_network('data/survey.bif', 2, 'min-fill')
+
+
+    def test_silent(self):
+        network = Network('data/alarm.bif')
+        file, util.file = util.file, io.StringIO()
+        flops = dict(algorithm.flops)
+        try:
+            algorithm.probability_of_evidence(network, {'Report': 'True', 'Smoke': 'False'})
+            self.assertEqual(util.file.getvalue(), '')
+            self.assertEqual(algorithm.flops, flops)
+        finally:
+            util.file = file
+
+
+    def test_generated(self):
+        network = generate.network(generate.random_dag(12, 2, 4, seed = 3), [2, 3])
+        evidence = {'X3': 's1', 'X11': 's0'}
+        expected = sum(probability for _, probability in joints(network, evidence))
+        for order in [None, 'min-degree']:
+            self.assertAlmostEqual(algorithm.probability_of_evidence(network, evidence, order), expected, 12)
+
+
+class TestEliminateParallel(unittest.TestCase):
+
+
+    def setUp(self):
+        self.cache = algorithm.cache
+        algorithm.cache = None
+        util.verbosity = 0
+
+
+    def tearDown(self):
+        algorithm.cache = self.cache
+        algorithm.threads = 1
+        util.verbosity = 1
+
+
+    def _assert_same(self, network, query, evidence, order):
+        algorithm.threads = 1
+        expected = ve(network, query, evidence, order)
+        algorithm.threads = 4
+        factor = ve(network, query, evidence, order)
+        self.assertEqual(factor.variables, expected.variables)
+        for value1, value2 in zip(factor.values, expected.values):
+            self.assertAlmostEqual(value1, value2, 12)
+
+
+    def test_tree(self):
+        network = generate.network(generate.random_dag(40, 3, 4, seed = 1))
+        factors = network.factors
+        order = algorithm.find_order(network, [], {}, [], 'min-fill')
+        buckets, children, roots, levels, remaining = elimination_tree(factors, order)
+
+        self.assertEqual(remaining, [])
+        self.assertEqual(sorted(factor.id for bucket in buckets for factor in bucket),
+            sorted(factor.id for factor in factors))
+        self.assertEqual(sorted(index for level in levels for index in level), list(range(len(order))))
+        level = {index: depth for depth, indices in enumerate(levels) for index in indices}
+        for index, others in enumerate(children):
+            self.assertTrue(all(level[child] < level[index] and child < index for child in others))
+        self.assertEqual(sorted(roots), [index for index in range(len(order))
+            if all(index not in others for others in children)])
+
+
+    def test_bundled(self):
+        for filename in ['data/alarm.bif', 'data/survey.bif', 'data/earthquake.bif']:
+            network = Network(filename)
+            names = [variable.name for variable in network.variables]
+            for query, observed in itertools.permutations(names, 2):
+                value = network.name_to_variable(observed).domain[0]
+                self._assert_same(network, [query], {observed: value}, 'min-fill')
+
+
+    def test_generated(self):
+        network = generate.network(generate.grid(4, 5), [2, 3], seed = 3)
+        self._assert_same(network, ['X3_4', 'X0_4'], {'X0_0': 's0'}, 'min-degree')
+        network = generate.network(generate.polytree(30, 3, seed = 4))
+        self._assert_same(network, ['X5'], {'X0': 's1', 'X2': 's0'}, 'min-fill')
+
+
+    def test_cache(self):
+        network = Network('data/alarm.bif')
+        algorithm.cache = FactorCache(2 ** 20)
+        algorithm.threads = 4
+        factor1 = ve(network, ['Leaving'], {'Smoke': 'True'}, 'min-fill')
+        misses = algorithm.cache.misses
+        factor2 = ve(network, ['Leaving'], {'Smoke': 'True'}, 'min-fill')
+        self.assertEqual(algorithm.cache.hits, misses)
+        self.assertEqual(factor1.values, factor2.values)
+
+
+class TestSink(unittest.TestCase):
+
+
+    def setUp(self):
+        self.network = Network('data/alarm.bif')
+        algorithm.cache.clear()
+
+
+    def tearDown(self):
+        util.sink = None
+        util.verbosity = 1
+
+
+    def test_verbosity(self):
+        util.verbosity = 0
+        self.assertIsNone(util.sink)
+        util.verbosity = 2
+        self.assertIs(type(util.sink), util.TextSink)
+
+
+    def test_events(self):
+        events = []
+        util.sink = lambda event, **fields: events.append((event, fields))
+        util.verbosity = 0
+        factor = ve(self.network, ['Leaving'], {'Smoke': 'True'}, 'min-fill')
+
+        names = [event for event, _ in events]
+        self.assertEqual(names[:4], ['setup', 'irrelevant', 'order', 'reduced'])
+        self.assertEqual(names[-1], 'result')
+        self.assertIs(events[-1][1]['factor'], factor)
+        steps = [fields['variable'].name for event, fields in events if event == 'step']
+        self.assertEqual(steps, [variable.name for variable in dict(events)['order']['order']])
+
+
+    def test_switch(self):
+        first, second = [], []
+
+        def sink(event, **fields):
+            first.append(event)
+            util.sink = lambda event, **fields: second.append(event)
+
+        # the events of a product all go to the sink attached when it started
+        util.sink = sink
+        factors = [self.network.factors[0], self.network.factors[1]]
+        algorithm.multiply_final(factors)
+        self.assertEqual(first, ['multiply', 'flops', 'timing', 'product'])
+        self.assertEqual(second, [])
+
+
+    def test_text(self):
+        file, util.file = util.file, io.StringIO()
+        try:
+            ve(self.network, ['Leaving'], {'Smoke': 'True'})
+            text = util.file.getvalue()
+        finally:
+            util.file = file
+        self.assertIn('Running VE on the following setup', text)
+        self.assertIn('Processing variable Fire', text)
+        self.assertIn('Normalization and final factor', text)
+
+
+class TestIrrelevant(unittest.TestCase):
+
+
+    def setUp(self):
+        util.verbosity = 0
+
+
+    def tearDown(self):
+        util.verbosity = 1
+
+
+    def _names(self, variables):
+        return sorted(variable.name for variable in variables)
+
+
+    def test_alarm(self):
+        network = Network('data/alarm.bif')
+        variables = network.variables
+
+        # the evidence on the parent blocks everything above it
+        self.assertEqual(self._names(algorithm.find_requisite(variables, ['Leaving'], {'Alarm': 'True'})),
+            ['Leaving'])
+        self.assertEqual(self._names(algorithm.find_irrelevant(variables, ['Leaving'], {'Alarm': 'True'})),
+            ['Alarm', 'Fire', 'Report', 'Smoke', 'Tampering'])
+
+        # the evidence on a common child connects its parents
+        self.assertEqual(self._names(algorithm.find_irrelevant(variables, ['Tampering'], {'Alarm': 'True'})),
+            ['Leaving', 'Report', 'Smoke'])
+        self.assertEqual(self._names(algorithm.find_irrelevant(variables, ['Tampering'], {})),
+            ['Alarm', 'Fire', 'Leaving', 'Report', 'Smoke'])
+
+
+    def test_components(self):
+        network = generate.network({'A': [], 'B': ['A'], 'C': ['B'], 'D': []})
+
+        # the factor of the observed root is a constant
+        self.assertEqual(self._names(algorithm.find_irrelevant(network.variables, ['C'], {'A': 's0'})),
+            ['A', 'D'])
+        self.assertEqual(self._names(algorithm.find_irrelevant(network.variables, ['C', 'D'], {'B': 's1'})),
+            ['A', 'B'])
+
+
+    def test_observed_query(self):
+        network = Network('data/alarm.bif')
+
+        # no factor is relevant when all the query variables are observed
+        for log in [False, True]:
+            self.assertEqual(ve(network, ['Alarm'], {'Alarm': 'True'}, log = log).values, [1.0])
+        self.assertEqual(ve_batch(network, [(['Alarm'], {'Alarm': 'True'})])[0].values, [1.0])
+        self.assertEqual(ve(network, ['Alarm', 'Fire'], {'Alarm': 'True', 'Fire': 'False'}).values, [1.0])
+
+        # an observed query variable next to an unobserved one is left out
+        factor = ve(network, ['Alarm', 'Fire'], {'Alarm': 'True'})
+        self.assertEqual(factor.variables, [network.name_to_variable('Fire')])
+        self.assertAlmostEqual(sum(factor.values), 1.0, 12)
+
+
+    def _test_network(self, network, size):
+        names = [variable.name for variable in network.variables]
+        for observed in itertools.combinations(names, size):
+            evidence = {name: network.name_to_variable(name).domain[-1] for name in observed}
+            posterior = {}
+            for assignment, probability in joints(network, evidence):
+                for name in names:
+                    key = (name, assignment[name])
+                    posterior[key] = posterior.get(key, 0) + probability
+
+            for name in names:
+                if name in evidence:
+                    continue
+                factor = ve(network, [name], evidence, 'min-fill')
+                total = sum(posterior[(name, value)] for value in factor.variables[0].domain)
+                for value, probability in zip(factor.variables[0].domain, factor.values):
+                    self.assertAlmostEqual(probability, posterior[(name, value)] / total, 12)
+
+
+    def test_bundled(self):
+        for filename in ['data/alarm.bif', 'data/survey.bif', 'data/earthquake.bif']:
+            self._test_network(Network(filename), 2)
+
+
+    def test_generated(self):
+        self._test_network(generate.network(generate.random_dag(10, 2, 4, seed = 5), [2, 3]), 2)
+
+
 class TestBarrenAlarm(unittest.TestCase):
 
 
@@ -203,5 +870,54 @@ class TestBarrenEarthquake(unittest.TestCase):
         self.assertEqual(barren, sorted(['Earthquake', 'Alarm', 'JohnCalls', 'MaryCalls']))
 
 
+class TestBarrenLarge(unittest.TestCase):
+
+
+    def setUp(self):
+        util.verbosity = 0
+
+
+    def tearDown(self):
+        util.verbosity = 1
+
+
+    def _link(self, parents):
+        variables = {name: Variable(name, ['a', 'b']) for name in parents}
+        for name, variable in variables.items():
+            variable.parents = sorted(variables[parent] for parent in parents[name])
+            variable.children = []
+        for variable in variables.values():
+            for parent in variable.parents:
+                parent.children.append(variable)
+        return sorted(variables.values())
+
+
+    def test_chain(self):
+        variables = self._link(generate.chain(5000))
+        barren = init_barren(variables, ['X2500'], {'X10': 'a'})
+        self.assertEqual(len(barren), 2499)
+        self.assertNotIn('X2500', [variable.name for variable in barren])
+
+
+    def test_ladder(self):
+        # every variable of a ladder is reached along exponentially many paths
+        variables = self._link(generate.ladder(200))
+        barren = init_barren(variables, ['X1_100'], {})
+        self.assertEqual(sorted(variable.name for variable in barren),
+            sorted(f'X{row}_{column}' for row in range(2) for column in range(101, 200)))
+
+
+    def test_memo(self):
+        network = Network('data/alarm.bif')
+        barren = init_barren(network.variables, ['Leaving'], {'Alarm': 'True'}, network.relevance)
+        self.assertIn(('barren', frozenset(['Leaving']), frozenset(['Alarm'])), network.relevance)
+
+        # the barren nodes only depend on the evidence variables, not their values
+        barren.clear()
+        self.assertEqual([variable.name for variable in
+            init_barren(network.variables, ['Leaving'], {'Alarm': 'False'}, network.relevance)],
+            ['Report', 'Smoke'])
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -315,6 +315,158 @@ class TestProductSmall(unittest.TestCase):
              2752, 1326, 610, 2494, 782, 6039, 6192, 1972])
 
 
+    def test_8(self):
+        # more variables than einsum has subscript labels for
+        variables = [Variable(f"V{i:02}", ['x']) for i in range(60)]
+
+        factor1 = Factor(variables[:40], [0.5])
+        factor2 = Factor(variables[20:], [0.4])
+
+        product_factor = factor1.product(factor2)
+        self.assertEqual(product_factor.variables, variables)
+        self.assertEqual(product_factor.values, [0.2])
+
+
+class TestTable(unittest.TestCase):
+
+
+    def test_shape(self):
+        va = Variable("A", map(str, range(3)))
+        vb = Variable("B", map(str, range(2)))
+
+        factor = Factor([va, vb], [0.5, 0.8, 0.1, 0, 0.3, 0.9])
+        self.assertEqual(factor.table.shape, (3, 2))
+        self.assertEqual(factor.table[2, 1], 0.9)
+
+
+    def test_scalar(self):
+        va = Variable("A", map(str, range(2)))
+
+        factor = Factor([va], [0.2, 0.6]).reduce(va, '1')
+        self.assertEqual(factor.table.shape, ())
+        self.assertEqual(factor.values, [0.6])
+
+
+    def test_normalize(self):
+        va = Variable("A", map(str, range(4)))
+
+        factor = Factor([va], [1, 2, 3, 4]).normalize()
+        self.assertEqual(factor.values, [0.1, 0.2, 0.3, 0.4])
+
+
+class TestReduceBatch(unittest.TestCase):
+
+
+    def setUp(self):
+        self.network = Network('data/survey.bif')
+        self.batch = Variable('', range(3))
+
+
+    def test_1(self):
+        factor = self.network.variable_to_factor(self.network.name_to_variable('T'))
+        variable = self.network.name_to_variable('R')
+        reduce = factor.reduce_batch(self.batch, variable, ['small', 'big', 'small'])
+
+        self.assertEqual(reduce.variables[0], self.batch)
+        self.assertEqual(reduce.values,
+            factor.reduce(variable, 'small').values +
+            factor.reduce(variable, 'big').values +
+            factor.reduce(variable, 'small').values)
+
+
+    def test_2(self):
+        factor = self.network.variable_to_factor(self.network.name_to_variable('T'))
+        variable1 = self.network.name_to_variable('O')
+        variable2 = self.network.name_to_variable('T')
+        values1 = ['self', 'emp', 'emp']
+        values2 = ['car', 'car', 'other']
+
+        reduce = factor.reduce_batch(self.batch, variable1, values1)
+        reduce = reduce.reduce_batch(self.batch, variable2, values2)
+
+        self.assertEqual(reduce.reduced, [variable1, variable2])
+        self.assertEqual(reduce.values, sum((
+            factor.reduce(variable1, value1).reduce(variable2, value2).values
+            for value1, value2 in zip(values1, values2)), []))
+
+
+class TestSumProduct(unittest.TestCase):
+
+
+    def setUp(self):
+        self.network = Network('data/survey.bif')
+        self.factors = [self.network.name_to_factor(name) for name in ['T', 'O', 'R', 'E']]
+
+
+    def _assert_equal(self, factor1, factor2):
+        self.assertEqual(factor1.variables, factor2.variables)
+        for value1, value2 in zip(factor1.values, factor2.values):
+            self.assertAlmostEqual(value1, value2, 12)
+
+
+    def _product_marginalize(self, factors, variable):
+        product = factors[0]
+        for factor in factors[1:]:
+            product = product.product(factor)
+        return product.marginalize(variable)
+
+
+    def test_1(self):
+        for name in ['O', 'R', 'E']:
+            variable = self.network.name_to_variable(name)
+            factors = [factor for factor in self.factors if variable in factor.variables]
+            self._assert_equal(Factor.sum_product(factors, variable), self._product_marginalize(factors, variable))
+
+
+    def test_2(self):
+        variable = self.network.name_to_variable('T')
+        factor = Factor.sum_product([self.factors[0]], variable)
+        self._assert_equal(factor, self.factors[0].marginalize(variable))
+
+
+    def test_log(self):
+        variable = self.network.name_to_variable('E')
+        factors = [factor.to_log() for factor in self.factors[1:]]
+        factor = Factor.sum_product(factors, variable)
+
+        self.assertTrue(factor.log)
+        self._assert_equal(factor.to_linear(), self._product_marginalize(self.factors[1:], variable))
+
+
+class TestLog(unittest.TestCase):
+
+
+    def setUp(self):
+        self.network = Network('data/survey.bif')
+
+
+    def _assert_equal(self, log_factor, factor):
+        self.assertTrue(log_factor.log)
+        self.assertEqual(log_factor.variables, factor.variables)
+        for value1, value2 in zip(log_factor.to_linear().values, factor.values):
+            self.assertAlmostEqual(value1, value2, 12)
+
+
+    def test_operations(self):
+        factor1 = self.network.variable_to_factor(self.network.name_to_variable('T'))
+        factor2 = self.network.variable_to_factor(self.network.name_to_variable('O'))
+        log1, log2 = factor1.to_log(), factor2.to_log()
+        variable = self.network.name_to_variable('O')
+
+        self._assert_equal(log1.marginalize(variable), factor1.marginalize(variable))
+        self._assert_equal(log1.reduce(variable, 'self'), factor1.reduce(variable, 'self'))
+        self._assert_equal(log1.product(log2), factor1.product(factor2))
+        self._assert_equal(log1.normalize(), factor1.normalize())
+
+
+    def test_zero(self):
+        va = Variable("A", map(str, range(2)))
+        vb = Variable("B", map(str, range(2)))
+
+        factor = Factor([va, vb], [0, 0, 0.5, 0])
+        self._assert_equal(factor.to_log().marginalize(vb), factor.marginalize(vb))
+
+
 class TestExtra(unittest.TestCase):
 
 
@@ -0,0 +1,89 @@
+import unittest
+import sys
+sys.path.extend(["src", "oracle"])
+import os
+import tempfile
+
+import generate
+from network import Network
+
+
+class TestGenerate(unittest.TestCase):
+
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.directory.name, 'generated.bif')
+
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+
+    def _test_parents(self, parents):
+        generate.write_bif(self.filename, parents, 3)
+        network = Network(self.filename, cache = False)
+        self.assertEqual(sorted(variable.name for variable in network.variables), sorted(parents))
+        for variable in network.variables:
+            self.assertEqual([parent.name for parent in variable.parents], sorted(parents[variable.name]))
+            self.assertEqual(len(variable.domain), 3)
+
+            # every row of the probability table sums to one
+            factor = network.variable_to_factor(variable)
+            axis = factor.variables.index(variable)
+            for total in factor.table.sum(axis = axis).flat:
+                self.assertAlmostEqual(total, 1.0, 12)
+
+
+    def test_chain(self):
+        self._test_parents(generate.chain(10))
+
+
+    def test_grid(self):
+        parents = generate.grid(3, 4)
+        self.assertEqual(len(parents), 12)
+        self.assertEqual(parents['X2_3'], ['X1_3', 'X2_2'])
+        self._test_parents(parents)
+
+
+    def test_random_dag(self):
+        parents = generate.random_dag(40, 3, 5, seed = 1)
+        self.assertEqual(parents, generate.random_dag(40, 3, 5, seed = 1))
+        for name, others in parents.items():
+            self.assertLessEqual(len(others), 3)
+            self.assertTrue(all(0 < int(name[1:]) - int(other[1:]) <= 5 for other in others))
+        self._test_parents(parents)
+
+
+    def test_polytree(self):
+        parents = generate.polytree(60, 2, seed = 3)
+        self.assertEqual(sum(map(len, parents.values())), 59)
+        self.assertLessEqual(max(map(len, parents.values())), 2)
+        self._test_parents(parents)
+
+
+    def test_structure(self):
+        self.assertEqual(generate.structure('grid', 12, treewidth = 3), generate.grid(3, 4))
+        self.assertEqual(generate.structure('ladder', 10), generate.grid(2, 5))
+        self.assertEqual(generate.structure('random-dag', 30, 2, 4, 5), generate.random_dag(30, 2, 4, 5))
+        with self.assertRaises(ValueError):
+            generate.structure('tree', 10)
+
+
+    def test_domains(self):
+        parents = generate.chain(200)
+        sizes = [len(domain) for domain in generate.domains(parents, {2: 1, 5: 1}, seed = 2).values()]
+        self.assertEqual(set(sizes), {2, 5})
+        sizes = [len(domain) for domain in generate.domains(parents, [3, 4]).values()]
+        self.assertEqual(set(sizes), {3, 4})
+
+
+    def test_network(self):
+        parents = generate.random_dag(30, 3, 4, seed = 2)
+        generate.write_bif(self.filename, parents, [2, 3], seed = 7)
+        parsed = Network(self.filename, cache = False)
+        built = generate.network(parents, [2, 3], seed = 7)
+        self.assertEqual(parsed.variables, built.variables)
+        for factor1, factor2 in zip(parsed.factors, built.factors):
+            self.assertEqual(factor1.variables, factor2.variables)
+            self.assertTrue((factor1.table == factor2.table).all())
@@ -0,0 +1,91 @@
+import unittest
+import sys
+sys.path.extend(["src", "oracle"])
+import itertools
+
+import util
+from network import Network
+from algorithm import ve
+from junction import JunctionTree
+from ordering import heuristics
+
+
+class TestJunctionTree(unittest.TestCase):
+
+
+    def setUp(self):
+        util.verbosity = 0
+
+
+    def tearDown(self):
+        util.verbosity = 1
+
+
+    def _assert_tree(self, tree):
+        # every pair of cliques sharing a variable is connected by cliques containing it
+        for variable in tree.network.variables:
+            containing = {index for index, clique in enumerate(tree.cliques) if variable in clique}
+            reached = {min(containing)}
+            frontier = [min(containing)]
+            for index in frontier:
+                for other in tree.neighbours[index] & containing - reached:
+                    reached.add(other)
+                    frontier.append(other)
+            self.assertEqual(reached, containing)
+
+        # a tree has one edge less than it has cliques
+        self.assertEqual(sum(map(len, tree.neighbours)), 2 * (len(tree.cliques) - 1))
+
+        # no clique is contained in another one
+        for clique1, clique2 in itertools.permutations(tree.cliques, 2):
+            self.assertFalse(clique1 <= clique2)
+
+
+    def _test_network(self, filename, size):
+        network = Network(filename)
+        names = [variable.name for variable in network.variables]
+
+        for heuristic in heuristics:
+            tree = JunctionTree(network, heuristic)
+            self._assert_tree(tree)
+
+            for observed in itertools.combinations(names, size):
+                domains = [network.name_to_variable(name).domain for name in observed]
+                for values in itertools.product(*domains):
+                    evidence = dict(zip(observed, values))
+                    tree.calibrate(evidence)
+
+                    marginals = tree.marginals()
+                    for name in names:
+                        if name in evidence:
+                            continue
+                        expected = ve(network, [name], evidence)
+                        for value1, value2 in zip(marginals[name].values, expected.values):
+                            self.assertAlmostEqual(value1, value2, 12)
+
+
+    def test_alarm(self):
+        self._test_network('data/alarm.bif', 2)
+
+
+    def test_survey(self):
+        self._test_network('data/survey.bif', 1)
+
+
+    def test_earthquake(self):
+        self._test_network('data/earthquake.bif', 2)
+
+
+    def test_order(self):
+        network = Network('data/alarm.bif')
+        tree = JunctionTree(network, ['Report', 'Leaving', 'Smoke', 'Alarm', 'Fire', 'Tampering'])
+        self._assert_tree(tree)
+
+        tree.calibrate({'Report': 'True'})
+        expected = ve(network, ['Fire'], {'Report': 'True'})
+        for value1, value2 in zip(tree.marginal('Fire').values, expected.values):
+            self.assertAlmostEqual(value1, value2, 12)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,211 @@
+import unittest
+import sys
+sys.path.extend(["src", "oracle"])
+import os
+import shutil
+import tempfile
+
+from network import Network, InternalNetwork
+
+
+class TestParser(unittest.TestCase):
+
+
+    def setUp(self):
+        with tempfile.NamedTemporaryFile('w', suffix = '.bif', delete = False) as file:
+            file.write(
+                '// a network spread over multiple lines\n'
+                'network "test" { property author ; }\n'
+                'variable A { type discrete [ 2 ] { x, /* inline */ y }; }\n'
+                'variable B {\n'
+                '  type discrete [ 2 ] {\n'
+                '    v,\n'
+                '    u\n'
+                '  };\n'
+                '}\n'
+                '/* a comment\n'
+                '   over two lines */ probability ( A ) { table 0.3, 0.7; }\n'
+                'probability ( B | A ) {\n'
+                '  table 0.1, 0.2,\n'
+                '        0.9, 0.8;\n'
+                '}\n')
+            self.filename = file.name
+
+
+    def tearDown(self):
+        os.remove(self.filename)
+
+
+    def test_internal(self):
+        network = InternalNetwork(self.filename)
+
+        self.assertEqual(network.name, '"test"')
+        self.assertEqual(network.values, {'A': ['x', 'y'], 'B': ['v', 'u']})
+        self.assertEqual(network.parents, {'A': [], 'B': ['A']})
+        self.assertEqual(network.tables['B'], [(['x'], [0.1, 0.9]), (['y'], [0.2, 0.8])])
+
+
+    def test_factors(self):
+        network = Network(self.filename, cache = False)
+
+        self.assertEqual(network.name_to_factor('A').values, [0.3, 0.7])
+        self.assertEqual(network.name_to_factor('B').values, [0.9, 0.1, 0.8, 0.2])
+
+
+    def test_from_tables(self):
+        network = Network.from_tables({'A': ['x', 'y'], 'B': ['v', 'u']}, {'A': [], 'B': ['A']},
+            {'A': [([], [0.3, 0.7])], 'B': [(['x'], [0.1, 0.9]), (['y'], [0.2, 0.8])]})
+
+        self.assertEqual(network.name_to_variable('B').parents, [network.name_to_variable('A')])
+        self.assertEqual(network.name_to_factor('B').values, [0.9, 0.1, 0.8, 0.2])
+
+
+class TestParserBundled(unittest.TestCase):
+
+
+    def test_alarm(self):
+        network = InternalNetwork('data/alarm.bif')
+
+        self.assertEqual(len(network.values), 6)
+        self.assertEqual(network.parents['Alarm'], ['Tampering', 'Fire'])
+        self.assertEqual(network.tables['Alarm'][1], (['False', 'True'], [0.99, 0.01]))
+
+
+    def test_survey(self):
+        network = InternalNetwork('data/survey.bif')
+
+        self.assertEqual(network.values['T'], ['car', 'train', 'other'])
+        self.assertEqual(network.tables['T'][0], (['emp', 'small'], [0.48, 0.42, 0.10]))
+
+
+class TestCompiled(unittest.TestCase):
+
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, 'survey.bif')
+        shutil.copy('data/survey.bif', self.filename)
+
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+
+    def _assert_equal(self, network1, network2):
+        self.assertEqual(network1.variables, network2.variables)
+        for variable1, variable2 in zip(network1.variables, network2.variables):
+            self.assertEqual(variable1.domain, variable2.domain)
+            self.assertEqual(variable1.parents, variable2.parents)
+            self.assertEqual(variable1.children, variable2.children)
+        for factor1, factor2 in zip(network1.factors, network2.factors):
+            self.assertEqual(factor1.variables, factor2.variables)
+            self.assertEqual(factor1.values, factor2.values)
+
+
+    def test_save_load(self):
+        network = Network(self.filename, cache = False)
+        path = os.path.join(self.directory, 'survey.bnc')
+        network.save(path)
+
+        loaded = Network.load(path)
+        self._assert_equal(network, loaded)
+        self.assertFalse(loaded.factors[0].table.flags.writeable)
+
+
+    def test_cache(self):
+        path = Network.cache_path(self.filename)
+        self.assertFalse(os.path.exists(path))
+
+        network = Network(self.filename)
+        self.assertTrue(os.path.exists(path))
+        self._assert_equal(network, Network(self.filename))
+
+
+    def test_cache_changed(self):
+        path = Network.cache_path(self.filename)
+        Network(self.filename)
+
+        with open(self.filename, 'a') as file:
+            file.write('\n')
+
+        self.assertNotEqual(Network.cache_path(self.filename), path)
+
+
+    def test_cache_stale(self):
+        directory = os.path.join(self.directory, Network.cache_directory)
+        Network(self.filename)
+
+        # an unversioned compiled network is removed, the one of another .bif file stays
+        os.rename(Network.cache_path(self.filename), os.path.join(directory, f'survey.bif.{"0" * 32}.bnc'))
+        with open(os.path.join(directory, f'survey.bif.x.bif.{"0" * 32}.v1.bnc'), 'wb'):
+            pass
+        Network(self.filename)
+        self.assertEqual(sorted(os.listdir(directory)),
+            sorted([f'survey.bif.x.bif.{"0" * 32}.v1.bnc', os.path.basename(Network.cache_path(self.filename))]))
+
+        # the compiled network of the old contents is removed
+        with open(self.filename, 'a') as file:
+            file.write('\n')
+        Network(self.filename)
+        self.assertEqual(sorted(os.listdir(directory)),
+            sorted([f'survey.bif.x.bif.{"0" * 32}.v1.bnc', os.path.basename(Network.cache_path(self.filename))]))
+
+
+    def test_cache_corrupt(self):
+        path = Network.cache_path(self.filename)
+        self.assertIn(f'.v{Network.version}.', path)
+        expected = Network(self.filename)
+        with open(path, 'rb') as file:
+            compiled = file.read()
+
+        # a garbage or truncated compiled network is parsed again and overwritten
+        for contents in [b'garbage', Network.magic + b'\x10\x00', compiled[:100], compiled[:-8]]:
+            with open(path, 'wb') as file:
+                file.write(contents)
+            self._assert_equal(Network(self.filename), expected)
+            self._assert_equal(Network.load(path), expected)
+
+
+    def test_not_compiled(self):
+        with self.assertRaises(ValueError):
+            Network.load(self.filename)
+
+
+class TestIndexes(unittest.TestCase):
+
+
+    def _assert_indexes(self, network):
+        for index, variable in enumerate(network.variables):
+            self.assertEqual(variable.id, index)
+            self.assertEqual(network.ids[variable.name], index)
+            self.assertIs(network.name_to_variable(variable.name), variable)
+            self.assertIn(variable, network.variable_to_factor(variable).variables)
+            self.assertIs(network.name_to_factor(variable.name), network.factors[index])
+            self.assertEqual(network.factors[index].variables, sorted([variable] + variable.parents))
+            self.assertEqual(network.parent_ids[index], [parent.id for parent in variable.parents])
+            self.assertEqual(network.child_ids[index],
+                [other.id for other in network.variables if variable in other.parents])
+
+
+    def test_bundled(self):
+        for filename in ['data/alarm.bif', 'data/survey.bif', 'data/earthquake.bif']:
+            self._assert_indexes(Network(filename, cache = False))
+
+
+    def test_compiled(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'alarm.bnc')
+            Network('data/alarm.bif', cache = False).save(path)
+            self._assert_indexes(Network.load(path))
+
+
+    def test_unknown(self):
+        network = Network('data/alarm.bif')
+        with self.assertRaises(AssertionError):
+            network.name_to_variable('Unknown')
+        with self.assertRaises(AssertionError):
+            network.name_to_factor('Unknown')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+import unittest
+import sys
+sys.path.extend(["src", "oracle"])
+
+import util
+from network import Network
+from algorithm import ve, init_barren
+from ordering import IndexedPriorityQueue, interaction_graph, greedy_order, heuristics
+
+
+class TestIndexedPriorityQueue(unittest.TestCase):
+
+
+    def test_pop(self):
+        queue = IndexedPriorityQueue()
+        for key, priority in [('a', 5), ('b', 1), ('c', 3), ('d', 4), ('e', 2)]:
+            queue.push(key, priority)
+
+        self.assertEqual([queue.pop() for _ in range(5)], ['b', 'e', 'c', 'd', 'a'])
+
+
+    def test_update(self):
+        queue = IndexedPriorityQueue()
+        for key, priority in [('a', 5), ('b', 1), ('c', 3)]:
+            queue.push(key, priority)
+
+        queue.push('a', 0)
+        queue.push('b', 9)
+
+        self.assertIn('c', queue)
+        self.assertEqual([queue.pop() for _ in range(3)], ['a', 'c', 'b'])
+        self.assertNotIn('c', queue)
+
+
+class TestInteractionGraph(unittest.TestCase):
+
+
+    def setUp(self):
+        self.network = Network('data/alarm.bif')
+        util.verbosity = 0
+
+
+    def tearDown(self):
+        util.verbosity = 1
+
+
+    def test_moralized(self):
+        graph = interaction_graph(self.network.variables, {}, [])
+        neighbours = sorted(map(str, graph[self.network.name_to_variable('Fire')]))
+
+        # the parents of Alarm are married
+        self.assertEqual(neighbours, ['Alarm', 'Smoke', 'Tampering'])
+
+
+    def test_evidence(self):
+        graph = interaction_graph(self.network.variables, {'Alarm': 'True'}, [])
+        neighbours = sorted(map(str, graph[self.network.name_to_variable('Fire')]))
+
+        self.assertNotIn(self.network.name_to_variable('Alarm'), graph)
+        self.assertEqual(neighbours, ['Smoke', 'Tampering'])
+
+
+    def test_order(self):
+        query = ['Leaving']
+        evidence = {'Smoke': 'True'}
+        barren = init_barren(self.network.variables, query, evidence)
+        graph = interaction_graph(self.network.variables, evidence, barren)
+        marginalize = [variable for variable in graph if variable.name not in query]
+
+        for heuristic in heuristics:
+            order = greedy_order(graph, marginalize, heuristic)
+            self.assertEqual(sorted(order), sorted(marginalize))
+
+
+class TestVEHeuristics(unittest.TestCase):
+
+
+    def setUp(self):
+        util.verbosity = 0
+
+
+    def tearDown(self):
+        util.verbosity = 1
+
+
+    def _test_network(self, filename, query, evidence):
+        network = Network(filename)
+        expected = ve(network, query, evidence)
+        for heuristic in heuristics:
+            factor = ve(network, query, evidence, heuristic)
+            for value1, value2 in zip(factor.values, expected.values):
+                self.assertAlmostEqual(value1, value2, 12, heuristic)
+
+
+    def test_alarm(self):
+        self._test_network('data/alarm.bif', ['Leaving', 'Smoke'], {'Alarm': 'False'})
+
+
+    def test_survey(self):
+        self._test_network('data/survey.bif', ['T'], {'A': 'adult'})
+
+
+    def test_earthquake(self):
+        self._test_network('data/earthquake.bif', ['Burglary'], {'JohnCalls': 'True'})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+import unittest
+import sys
+sys.path.extend(["src", "oracle"])
+import io
+import itertools
+import threading
+
+import util
+from factor import Factor
+from network import Network
+from algorithm import ve
+from parallel import ParallelInference
+from variable import Variable
+
+
+class TestParallelInference(unittest.TestCase):
+
+
+    def setUp(self):
+        self.network = Network('data/alarm.bif')
+        util.verbosity = 0
+
+
+    def tearDown(self):
+        util.verbosity = 1
+
+
+    def _jobs(self):
+        names = [variable.name for variable in self.network.variables]
+        jobs = []
+        for query, observed in itertools.product(names, names):
+            if query != observed:
+                for value in self.network.name_to_variable(observed).domain:
+                    jobs.append(([query], {observed: value}))
+        return jobs
+
+
+    def test_order(self):
+        jobs = self._jobs()
+        with ParallelInference(self.network, processes = 3, chunksize = 4, order = 'min-fill') as executor:
+            factors = executor.map(jobs)
+
+        self.assertEqual(len(factors), len(jobs))
+        for (query, evidence), factor in zip(jobs, factors):
+            expected = ve(self.network, query, evidence, 'min-fill')
+            self.assertEqual(factor.variables, expected.variables)
+            self.assertIs(factor.variables[0], self.network.name_to_variable(query[0]))
+            self.assertEqual(factor.reduced, expected.reduced)
+            for value1, value2 in zip(factor.values, expected.values):
+                self.assertAlmostEqual(value1, value2, 12)
+
+
+    def test_isolated(self):
+        file, util.file = util.file, io.StringIO()
+        util.verbosity = 1
+        try:
+            with ParallelInference('data/survey.bif', processes = 2, log = True) as executor:
+                factors = executor.map([(['T'], {'A': 'adult'}), (['E'], {})] * 5)
+            self.assertEqual(util.file.getvalue(), '')
+        finally:
+            util.file = file
+        self.assertEqual(len({factor.id for factor in factors}), len(factors))
+        self.assertIs(type(util.sink), util.TextSink)
+
+
+    def test_uid(self):
+        variable = Variable('A', ['a', 'b'])
+        ids = []
+
+        def create():
+            ids.extend(Factor([variable], [0.5, 0.5]).id for _ in range(1000))
+
+        threads = [threading.Thread(target = create) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(set(ids)), 4000)
@@ -0,0 +1,90 @@
+import unittest
+import sys
+sys.path.extend(["src", "oracle"])
+import random
+
+import util
+from network import Network
+from algorithm import ve
+from session import Session
+
+
+class TestSession(unittest.TestCase):
+
+
+    def setUp(self):
+        self.network = Network('data/alarm.bif')
+        self.session = Session(self.network)
+        util.verbosity = 0
+
+
+    def tearDown(self):
+        util.verbosity = 1
+
+
+    def _assert_marginals(self):
+        for variable in self.network.variables:
+            if variable.name in self.session.evidence:
+                continue
+            expected = ve(self.network, [variable.name], dict(self.session.evidence))
+            for value1, value2 in zip(self.session.marginal(variable.name).values, expected.values):
+                self.assertAlmostEqual(value1, value2, 12)
+
+
+    def test_observe_retract(self):
+        self._assert_marginals()
+
+        self.session.observe('Report', 'True')
+        self._assert_marginals()
+
+        self.session.observe('Smoke', 'False')
+        self._assert_marginals()
+
+        self.session.observe('Report', 'False')
+        self._assert_marginals()
+
+        self.session.retract('Report')
+        self._assert_marginals()
+
+        self.session.retract('Smoke')
+        self.assertEqual(self.session.evidence, {})
+        self._assert_marginals()
+
+
+    def test_random(self):
+        names = [variable.name for variable in self.network.variables]
+        random.seed(0)
+        for _ in range(50):
+            name = random.choice(names)
+            if random.random() < 0.3:
+                self.session.retract(name)
+            else:
+                self.session.observe(name, random.choice(['False', 'True']))
+            self._assert_marginals()
+
+
+    def test_cached(self):
+        self.session.observe('Leaving', 'True')
+        marginal = self.session.marginal('Fire')
+        self.assertIs(self.session.marginal('Fire'), marginal)
+
+        # observing the same value again keeps the cache
+        self.session.observe('Leaving', 'True')
+        self.assertIs(self.session.marginal('Fire'), marginal)
+
+        self.session.observe('Smoke', 'True')
+        self.assertIsNot(self.session.marginal('Fire'), marginal)
+
+
+    def test_invalidate(self):
+        self.session.marginals()
+        messages = len(self.session.tree.messages)
+        self.assertEqual(messages, 2 * (len(self.session.tree.cliques) - 1))
+
+        # only the messages directed away from the clique of Smoke are removed
+        self.session.observe('Smoke', 'True')
+        self.assertEqual(len(self.session.tree.messages), messages // 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+import unittest
+import sys
+sys.path.extend(["src", "oracle"])
+import io
+import json
+
+import util
+import algorithm
+from network import Network
+from algorithm import ve
+from tracing import Trace
+
+
+class TestTrace(unittest.TestCase):
+
+
+    def setUp(self):
+        self.network = Network('data/survey.bif')
+        algorithm.cache.clear()
+        util.verbosity = 0
+
+
+    def tearDown(self):
+        util.verbosity = 1
+
+
+    def _size(self, names):
+        size = 1
+        for name in names:
+            size *= len(self.network.name_to_variable(name).domain)
+        return size
+
+
+    def test_steps(self):
+        with Trace() as trace:
+            ve(self.network, ['T'], {'A': 'adult'}, ['O', 'R', 'S', 'E'])
+        self.assertIsNone(util.sink)
+
+        self.assertEqual([step['variable'] for step in trace.steps], ['O', 'R', 'S', 'E', None])
+        for step in trace.steps:
+            self.assertFalse(step['reused'])
+            self.assertGreaterEqual(step['product_time'], 0)
+            self.assertGreaterEqual(step['marginalize_time'], 0)
+            for factor in step['inputs']:
+                self.assertEqual(factor['size'], self._size(factor['scope']))
+            scope = set().union(*(factor['scope'] for factor in step['inputs']))
+            self.assertEqual(step['product_size'], self._size(scope))
+            self.assertEqual(sorted(scope - {step['variable']}), step['output']['scope'])
+
+        self.assertEqual(trace.largest()['product_size'], max(step['product_size'] for step in trace.steps))
+
+        # the final product gives the posterior over T
+        self.assertEqual(trace.steps[-1]['output']['scope'], ['T'])
+        self.assertEqual(trace.steps[-1]['marginalize_time'], 0)
+
+
+    def test_reused(self):
+        ve(self.network, ['T'], {'A': 'adult'}, ['O', 'R', 'S', 'E'])
+        with Trace() as trace:
+            ve(self.network, ['T'], {'A': 'adult'}, ['O', 'R', 'S', 'E'])
+        self.assertTrue(all(step['reused'] for step in trace.steps[:-1]))
+        self.assertFalse(trace.steps[-1]['reused'])
+
+
+    def test_maximize(self):
+        with Trace() as trace:
+            algorithm.mpe(self.network, {'A': 'adult'}, ['E', 'O', 'R', 'S', 'T'])
+        self.assertEqual([step['variable'] for step in trace.steps], ['E', 'O', 'R', 'S', 'T', None])
+        self.assertEqual(trace.steps[0]['output']['scope'], ['O', 'R', 'S'])
+        self.assertGreater(trace.steps[0]['product_size'], trace.steps[0]['output']['size'])
+
+
+    def test_write(self):
+        with Trace() as trace:
+            ve(self.network, ['T'], {}, 'min-fill')
+        file = io.StringIO()
+        trace.write(file)
+        lines = file.getvalue().splitlines()
+        self.assertEqual(len(lines), len(trace.steps))
+        self.assertEqual([json.loads(line) for line in lines], trace.steps)
+
+
+    def test_text(self):
+        file, util.file = util.file, io.StringIO()
+        util.verbosity = 1
+        try:
+            with Trace(util.TextSink()) as trace:
+                ve(self.network, ['T'], {}, 'min-fill')
+            text = util.file.getvalue()
+        finally:
+            util.file = file
+        self.assertIn('Normalization and final factor', text)
+        self.assertEqual(trace.steps[-1]['output']['scope'], ['T'])